@@ -10,11 +10,31 @@ import numpy as np
 import yfinance as yf
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import functools
+import hashlib
+import io
 import json
 import os
-from typing import Dict, List, Tuple
+import re
+import sqlite3
+import sys
+import tempfile
+from statistics import NormalDist
+from typing import Callable, Dict, Iterable, List, Tuple
+import threading
 import time
+import zlib
+
+# Parquet needs pyarrow; fall back to pickle files without it
+try:
+    import pyarrow
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
 
 # Page configuration
 st.set_page_config(
@@ -66,23 +86,2049 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+class RenderProfiler:
+    """Opt-in timing of rerun phases and hot method calls"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.events = []  # (kind, name, start offset, duration, thread id)
+        self._lock = threading.Lock()
+
+    def _record(self, kind: str, name: str, start: float, end: float):
+        with self._lock:
+            self.events.append((kind, name, start - self.started, end - start, threading.get_ident()))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time one phase of the rerun"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record('phase', name, start, time.perf_counter())
+
+    def record_call(self, name: str, start: float, end: float):
+        """Record one instrumented method call"""
+        self._record('call', name, start, end)
+
+    def summary(self) -> pd.DataFrame:
+        """Count, total, mean and max milliseconds per phase and call"""
+        events = pd.DataFrame(self.events, columns=['kind', 'name', 'start', 'duration', 'thread'])
+        if events.empty:
+            return pd.DataFrame(columns=['kind', 'name', 'count', 'total_ms', 'mean_ms', 'max_ms'])
+        events['duration'] *= 1000
+        summary = events.groupby(['kind', 'name'], sort=False)['duration'].agg(['count', 'sum', 'mean', 'max'])
+        summary.columns = ['count', 'total_ms', 'mean_ms', 'max_ms']
+        return summary.reset_index().sort_values(['kind', 'total_ms'], ascending=[False, False])
+
+    def to_trace(self) -> Dict:
+        """Chrome trace-event JSON (load in chrome://tracing or Perfetto)"""
+        return {
+            'traceEvents': [
+                {
+                    'name': name, 'cat': kind, 'ph': 'X', 'pid': os.getpid(), 'tid': thread,
+                    'ts': round(start * 1e6), 'dur': round(duration * 1e6)
+                }
+                for kind, name, start, duration, thread in self.events
+            ],
+            'metadata': {
+                'recorded_at': datetime.now().isoformat(),
+                'total_ms': (time.perf_counter() - self.started) * 1000
+            }
+        }
+
+def profiled(method):
+    """Record calls to a PortfolioTracker method on its profiler"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler = self.profiler
+        if not profiler.enabled:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profiler.record_call(method.__name__, start, time.perf_counter())
+    return wrapper
+
+class MarketDataProvider:
+    """Base interface for market data sources"""
+
+    name = "base"
+
+    def get_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        """Return the latest price for every symbol in a single request"""
+        raise NotImplementedError
+
+    def get_history(self, symbol: str, start: date, end: date) -> pd.DataFrame:
+        """Return daily OHLCV bars for start..end (inclusive)"""
+        raise NotImplementedError
+
+class YFinanceProvider(MarketDataProvider):
+    """Live quotes from Yahoo Finance, batched through yf.download"""
+
+    name = "yfinance"
+
+    def get_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        """Download the last few daily bars for all symbols at once"""
+        if not symbols:
+            return {}
+
+        # A few days of bars so symbols without a print today still resolve
+        data = yf.download(
+            tickers=list(symbols),
+            period='5d',
+            interval='1d',
+            group_by='column',
+            auto_adjust=False,
+            progress=False,
+            threads=True
+        )
+        if data is None or data.empty or 'Close' not in data:
+            return {}
+
+        closes = data['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(name=symbols[0])
+
+        last_prices = closes.ffill().iloc[-1].dropna()
+        return {str(symbol): float(price) for symbol, price in last_prices.items()}
+
+    def get_history(self, symbol: str, start: date, end: date) -> pd.DataFrame:
+        """Daily bars from yf.Ticker.history (end is exclusive there)"""
+        stock = yf.Ticker(symbol)
+        return stock.history(start=start, end=end + timedelta(days=1))
+
+class LocalQuoteProvider(MarketDataProvider):
+    """Offline stand-in provider for demos and benchmarks"""
+
+    name = "local"
+
+    def __init__(self, prices: Dict[str, float] = None, latency: float = 0.0):
+        self.prices = dict(prices or {})
+        self.latency = latency
+        self.request_count = 0
+
+    def get_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        """Serve all symbols in one simulated round trip"""
+        self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        return {symbol: self._price(symbol) for symbol in symbols}
+
+    def _price(self, symbol: str) -> float:
+        """Known price, or a deterministic synthetic one for unknown symbols"""
+        if symbol in self.prices:
+            return self.prices[symbol]
+        return 10.0 + (zlib.crc32(symbol.encode()) % 49000) / 100
+
+    def get_history(self, symbol: str, start: date, end: date) -> pd.DataFrame:
+        """Synthetic daily bars; each date's value is independent of the range asked for"""
+        self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        dates = pd.bdate_range(start, end)
+        if len(dates) == 0:
+            return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+
+        seed = zlib.crc32(symbol.encode())
+        base = self._price(symbol)
+        days = (dates - pd.Timestamp('2000-01-01')).days.to_numpy(dtype=np.float64)
+        close = base * (
+            1
+            + 0.15 * np.sin(2 * np.pi * days / 90 + seed % 7)
+            + 0.05 * np.sin(2 * np.pi * days / 11 + seed % 5)
+        )
+        return pd.DataFrame({
+            'Open': close * 0.995,
+            'High': close * 1.01,
+            'Low': close * 0.99,
+            'Close': close,
+            'Volume': (1e6 + (seed % 1000) * 1e3) * np.ones(len(dates))
+        }, index=pd.DatetimeIndex(dates, name='Date'))
+
+REPLAY_COLUMNS = ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+class ReplayProvider(MarketDataProvider):
+    """Deterministic provider that replays daily bars from a local file
+
+    Bars are held sorted by symbol and date, so history requests are two
+    binary searches and a slice. Quotes come from a dense close matrix at
+    the replay clock, which stays put (as_of) or advances one bar per quote
+    request (step) to simulate a live session. Nothing after the clock is
+    ever served.
+    """
+
+    name = "replay"
+
+    def __init__(self, bars: pd.DataFrame, as_of: date = None, step: bool = False, latency: float = 0.0):
+        bars = bars[REPLAY_COLUMNS].copy()
+        bars['Date'] = pd.to_datetime(bars['Date']).dt.normalize()
+        bars = bars.sort_values(['Symbol', 'Date'], kind='stable').reset_index(drop=True)
+
+        self.latency = latency
+        self.step = step
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+        # Per-symbol [start, stop) row ranges into the sorted bars
+        symbols = bars['Symbol'].to_numpy()
+        boundaries = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        stops = np.concatenate((boundaries, [len(bars)]))
+        self._ranges = {symbols[start]: (start, stop) for start, stop in zip(starts, stops)} if len(bars) else {}
+        self._bar_dates = bars['Date'].to_numpy()
+        self._ohlcv = bars[['Open', 'High', 'Low', 'Close', 'Volume']].to_numpy(dtype=np.float64)
+
+        closes = bars.pivot(index='Date', columns='Symbol', values='Close').sort_index().ffill()
+        self.dates = closes.index
+        self._columns = {symbol: j for j, symbol in enumerate(closes.columns)}
+        self._closes = closes.to_numpy(dtype=np.float64)
+
+        self._cursor = len(self.dates) - 1
+        if as_of is not None:
+            self._cursor = max(int(self.dates.searchsorted(pd.Timestamp(as_of), side='right')) - 1, 0)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'ReplayProvider':
+        return cls(load_frame(path), **kwargs)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._columns)
+
+    @property
+    def clock(self) -> pd.Timestamp:
+        """Replay date that quotes are currently served from"""
+        return self.dates[self._cursor] if len(self.dates) else None
+
+    def get_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        """Closes at the replay clock; advances the clock in step mode"""
+        with self._lock:
+            self.request_count += 1
+            row = self._cursor
+            if self.step:
+                self._cursor = min(self._cursor + 1, len(self.dates) - 1)
+        if self.latency:
+            time.sleep(self.latency)
+
+        if row < 0:
+            return {}
+        quotes = {}
+        for symbol in symbols:
+            column = self._columns.get(symbol)
+            if column is not None and not np.isnan(self._closes[row, column]):
+                quotes[symbol] = float(self._closes[row, column])
+        return quotes
+
+    def get_history(self, symbol: str, start: date, end: date) -> pd.DataFrame:
+        """Recorded bars for start..end, cut off at the replay clock"""
+        with self._lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if symbol not in self._ranges or self.clock is None:
+            return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+
+        first, last = self._ranges[symbol]
+        dates = self._bar_dates[first:last]
+        end = min(pd.Timestamp(end), self.clock)
+        lo = first + int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left'))
+        hi = first + int(np.searchsorted(dates, np.datetime64(end), side='right'))
+        return pd.DataFrame(
+            self._ohlcv[lo:hi],
+            columns=['Open', 'High', 'Low', 'Close', 'Volume'],
+            index=pd.DatetimeIndex(self._bar_dates[lo:hi], name='Date')
+        )
+
+def generate_replay_bars(symbols: List[str], start: date, end: date, seed: int = 0) -> pd.DataFrame:
+    """Synthetic daily bars (geometric random walk) in replay format
+
+    The output depends only on the arguments, so a seed reproduces the
+    same dataset on any machine.
+    """
+    dates = pd.bdate_range(start, end)
+    rng = np.random.default_rng(seed)
+    n_days, n_symbols = len(dates), len(symbols)
+
+    first_close = rng.uniform(10, 500, n_symbols)
+    volatility = rng.uniform(0.005, 0.03, n_symbols)
+    drift = rng.normal(0.0003, 0.0005, n_symbols)
+    log_returns = drift + volatility * rng.standard_normal((n_days, n_symbols))
+    log_returns[0] = 0.0
+    close = first_close * np.exp(np.cumsum(log_returns, axis=0))
+
+    open_ = np.vstack([first_close, close[:-1]]) * (1 + 0.002 * rng.standard_normal((n_days, n_symbols)))
+    high = np.maximum(open_, close) * (1 + np.abs(0.005 * rng.standard_normal((n_days, n_symbols))))
+    low = np.minimum(open_, close) * (1 - np.abs(0.005 * rng.standard_normal((n_days, n_symbols))))
+    volume = rng.integers(100_000, 10_000_000, (n_days, n_symbols)).astype(np.float64)
+
+    return pd.DataFrame({
+        'Date': np.tile(dates.to_numpy(), n_symbols),
+        'Symbol': np.repeat(np.asarray(symbols, dtype=object), n_days),
+        'Open': open_.T.ravel(),
+        'High': high.T.ravel(),
+        'Low': low.T.ravel(),
+        'Close': close.T.ravel(),
+        'Volume': volume.T.ravel()
+    })
+
+def record_replay_bars(provider: MarketDataProvider, symbols: List[str], start: date, end: date) -> pd.DataFrame:
+    """Capture bars from a live provider in replay format"""
+    frames = []
+    for symbol in symbols:
+        try:
+            bars = provider.get_history(symbol, start, end)
+        except Exception:
+            continue
+        if bars is None or bars.empty:
+            continue
+        bars = bars[['Open', 'High', 'Low', 'Close', 'Volume']].copy()
+        if bars.index.tz is not None:
+            bars.index = bars.index.tz_localize(None)
+        bars['Date'] = bars.index.normalize()
+        bars['Symbol'] = symbol
+        frames.append(bars.reset_index(drop=True))
+    if not frames:
+        return pd.DataFrame(columns=REPLAY_COLUMNS)
+    return pd.concat(frames, ignore_index=True)[REPLAY_COLUMNS]
+
+def get_replay_provider() -> ReplayProvider:
+    """Replay provider for PORTFOLIO_REPLAY_PATH, generating a synthetic dataset on first use"""
+    data_dir = os.environ.get('PORTFOLIO_DATA_DIR', '.portfolio_data')
+    path = os.environ.get('PORTFOLIO_REPLAY_PATH', os.path.join(data_dir, f"replay.{FRAME_EXT}"))
+    if not os.path.exists(path):
+        count = int(os.environ.get('PORTFOLIO_REPLAY_SYMBOLS', '1000'))
+        end = date.today()
+        bars = generate_replay_bars(
+            [f"S{i:04d}" for i in range(count)],
+            end - timedelta(days=int(os.environ.get('PORTFOLIO_REPLAY_DAYS', '730'))),
+            end,
+            seed=int(os.environ.get('PORTFOLIO_REPLAY_SEED', '0'))
+        )
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        save_frame(bars, path)
+
+    as_of = os.environ.get('PORTFOLIO_REPLAY_AS_OF')
+    return ReplayProvider.from_file(
+        path,
+        as_of=date.fromisoformat(as_of) if as_of else None,
+        step=os.environ.get('PORTFOLIO_REPLAY_STEP') == '1',
+        latency=float(os.environ.get('PORTFOLIO_LOCAL_LATENCY', '0'))
+    )
+
+@st.cache_resource
+def get_market_data_provider() -> MarketDataProvider:
+    """Select the market data provider (PORTFOLIO_PRICE_PROVIDER=yfinance|local|replay)"""
+    provider_name = os.environ.get('PORTFOLIO_PRICE_PROVIDER', 'yfinance').lower()
+    if provider_name == 'replay':
+        return get_replay_provider()
+    if provider_name == 'local':
+        return LocalQuoteProvider(
+            latency=float(os.environ.get('PORTFOLIO_LOCAL_LATENCY', '0'))
+        )
+    return YFinanceProvider()
+
+class PriceFetcher:
+    """Bounded thread pool for quote requests with per-request and render deadlines"""
+
+    def __init__(self, max_workers: int = 8, batch_size: int = 100):
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='price-fetch')
+        self._lock = threading.Lock()
+        self.latencies = {}  # symbol -> seconds taken by its last request
+        self.errors = {}     # symbol -> last error message
+        self.last_known = {}
+
+    def _timed_call(self, loader: Callable[[List[str]], Dict[str, float]], chunk: List[str],
+                    started: List[float]) -> Tuple[Dict[str, float], float]:
+        """Run one provider request and measure it"""
+        started.append(time.monotonic())
+        prices = loader(chunk)
+        return prices, time.monotonic() - started[0]
+
+    def _record(self, chunk: List[str], prices: Dict[str, float], elapsed: float):
+        """Remember latency and last known prices for a finished request"""
+        with self._lock:
+            for symbol in chunk:
+                self.latencies[symbol] = elapsed
+                self.errors.pop(symbol, None)
+            self.last_known.update(prices)
+
+    def fetch(self, symbols: List[str], loader: Callable[[List[str]], Dict[str, float]],
+              symbol_timeout: float, deadline: float,
+              on_late_result: Callable[[Dict[str, float]], None] = None,
+              batch_size: int = None, track: bool = True) -> Tuple[Dict[str, float], List[str]]:
+        """Fetch quotes concurrently in batches
+
+        Returns the prices that arrived in time and the symbols that missed
+        either their own timeout or the overall monotonic deadline. Requests
+        that miss are left running; their results go to on_late_result.
+        With track=False (loads that are not quotes, such as price history)
+        latencies, errors and last known prices are left alone.
+        """
+        batch_size = batch_size or self.batch_size
+        jobs = {}
+        for i in range(0, len(symbols), batch_size):
+            chunk = symbols[i:i + batch_size]
+            started = []
+            future = self._executor.submit(self._timed_call, loader, chunk, started)
+            jobs[future] = (chunk, started)
+
+        prices = {}
+        missed = set()
+        pending = set(jobs)
+        while pending:
+            now = time.monotonic()
+            expired = {f for f in pending if jobs[f][1] and now - jobs[f][1][0] > symbol_timeout}
+            if now >= deadline:
+                expired = set(pending)
+            missed |= expired
+            pending -= expired
+            if not pending:
+                break
+
+            # Wake up at the first completion, the earliest request expiry or the deadline
+            wake_at = min([deadline] + [jobs[f][1][0] + symbol_timeout for f in pending if jobs[f][1]])
+            done, pending = wait(pending, timeout=max(wake_at - now, 0.001), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                chunk = jobs[future][0]
+                try:
+                    chunk_prices, elapsed = future.result()
+                except Exception as e:
+                    if track:
+                        with self._lock:
+                            for symbol in chunk:
+                                self.errors[symbol] = f"{type(e).__name__}: {e}"
+                    continue
+                if track:
+                    self._record(chunk, chunk_prices, elapsed)
+                prices.update(chunk_prices)
+
+        timed_out = []
+        for future in missed:
+            chunk = jobs[future][0]
+            timed_out.extend(chunk)
+            if not track:
+                continue
+            with self._lock:
+                for symbol in chunk:
+                    self.errors[symbol] = f"Timed out after {symbol_timeout:.1f}s"
+            future.add_done_callback(lambda f, c=chunk: self._late_result(f, c, on_late_result))
+
+        return prices, timed_out
+
+    def _late_result(self, future, chunk: List[str], on_late_result: Callable[[Dict[str, float]], None]):
+        """Keep results of requests that finished after their deadline"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        chunk_prices, elapsed = future.result()
+        self._record(chunk, chunk_prices, elapsed)
+        if on_late_result:
+            on_late_result(chunk_prices)
+
+@st.cache_resource
+def get_price_fetcher() -> PriceFetcher:
+    """Process-wide quote fetch pool (PORTFOLIO_FETCH_WORKERS, PORTFOLIO_FETCH_BATCH)"""
+    return PriceFetcher(
+        max_workers=int(os.environ.get('PORTFOLIO_FETCH_WORKERS', '8')),
+        batch_size=int(os.environ.get('PORTFOLIO_FETCH_BATCH', '100'))
+    )
+
+# Calendar days covered by each yfinance-style period string
+PERIOD_DAYS = {
+    '5d': 7,
+    '1wk': 7,
+    '1mo': 31,
+    '3mo': 92,
+    '6mo': 183,
+    '1y': 366,
+    '2y': 731,
+    '5y': 1827,
+    '10y': 3653
+}
+
+def period_start(period: str, end: date = None) -> date:
+    """Translate a period string ('1mo', '1y', 'ytd', 'max') into a start date"""
+    end = end or date.today()
+    if period == 'ytd':
+        return date(end.year, 1, 1)
+    if period == 'max':
+        return date(1970, 1, 1)
+    return end - timedelta(days=PERIOD_DAYS.get(period, 31))
+
+FRAME_EXT = 'parquet' if PARQUET_AVAILABLE else 'pkl'
+
+def save_frame(frame: pd.DataFrame, path: str):
+    """Atomically write a DataFrame as Parquet (or pickle without pyarrow)"""
+    if PARQUET_AVAILABLE:
+        frame.to_parquet(path + '.tmp')
+    else:
+        frame.to_pickle(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def load_frame(path: str) -> pd.DataFrame:
+    """Read a DataFrame written by save_frame"""
+    if PARQUET_AVAILABLE:
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+class HistoryStore:
+    """Per-symbol on-disk OHLCV store that only fetches missing date ranges
+
+    A range the provider answers with no bars at all, before the first
+    stored bar (a symbol listed after the requested start) or for a symbol
+    with nothing stored (a mistyped or delisted ticker), is remembered as
+    empty and not asked for again until empty_retry_interval has passed.
+    """
+
+    # Re-fetch today's (still forming) bar at most this often
+    refresh_interval = 15 * 60
+    # Re-ask for a range that came back empty at most this often
+    empty_retry_interval = 6 * 3600
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._symbol_locks = defaultdict(threading.Lock)
+
+    def _symbol_lock(self, symbol: str) -> threading.Lock:
+        """Per-symbol lock: concurrent sessions asking for the same symbol
+        wait for the first fetch and then read it from the store"""
+        with self._lock:
+            return self._symbol_locks[symbol]
+
+    def _paths(self, symbol: str) -> Tuple[str, str]:
+        """Data file and coverage metadata file for a symbol"""
+        safe_symbol = re.sub(r'[^A-Za-z0-9._-]', '_', symbol)
+        return (
+            os.path.join(self.root, f"{safe_symbol}.{FRAME_EXT}"),
+            os.path.join(self.root, f"{safe_symbol}.json")
+        )
+
+    def load(self, symbol: str) -> Tuple[pd.DataFrame, Dict]:
+        """Read stored bars and coverage metadata"""
+        data_path, meta_path = self._paths(symbol)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return pd.DataFrame(), {}
+
+        try:
+            bars = load_frame(data_path)
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except Exception:
+            return pd.DataFrame(), {}
+        return bars, meta
+
+    def _save(self, symbol: str, bars: pd.DataFrame, meta: Dict):
+        """Atomically replace the stored bars and metadata"""
+        data_path, meta_path = self._paths(symbol)
+        save_frame(bars, data_path)
+
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def _missing_ranges(self, meta: Dict, start: date, end: date) -> List[Tuple[date, date]]:
+        """Date ranges not yet covered by the store (nor recently answered empty)"""
+        if 'start' not in meta:
+            ranges = [(start, end)]
+        else:
+            covered_start = date.fromisoformat(meta['start'])
+            covered_end = date.fromisoformat(meta['end'])
+            ranges = []
+            if start < covered_start:
+                ranges.append((start, covered_start - timedelta(days=1)))
+            if end > covered_end:
+                ranges.append((covered_end, end))
+            elif end == covered_end and time.time() - meta.get('fetched_at', 0) > self.refresh_interval:
+                ranges.append((covered_end, end))
+
+        empty = meta.get('empty')
+        if empty and time.time() - empty['checked_at'] < self.empty_retry_interval:
+            empty_start, empty_end = date.fromisoformat(empty['start']), date.fromisoformat(empty['end'])
+            ranges = [(range_start, range_end) for range_start, range_end in ranges
+                      if not (empty_start <= range_start and range_end <= empty_end)]
+        return ranges
+
+    @staticmethod
+    def _empty_range(meta: Dict, start: date, end: date) -> Dict:
+        """Negative-cache entry for start..end, merged with an overlapping one"""
+        empty = meta.get('empty')
+        if empty and date.fromisoformat(empty['start']) <= end + timedelta(days=1) \
+                and start <= date.fromisoformat(empty['end']) + timedelta(days=1):
+            start = min(start, date.fromisoformat(empty['start']))
+            end = max(end, date.fromisoformat(empty['end']))
+        return {'start': start.isoformat(), 'end': end.isoformat(), 'checked_at': time.time()}
+
+    def get(self, symbol: str, start: date, end: date,
+            fetch: Callable[[str, date, date], pd.DataFrame]) -> pd.DataFrame:
+        """Bars for start..end, fetching only the uncovered ranges"""
+        with self._symbol_lock(symbol):
+            bars, meta = self.load(symbol)
+            ranges = self._missing_ranges(meta, start, end)
+
+            if ranges:
+                frames = [bars] if not bars.empty else []
+                covered_start = date.fromisoformat(meta['start']) if 'start' in meta else start
+                covered_end = date.fromisoformat(meta['end']) if 'start' in meta else None
+                empty = meta.get('empty')
+
+                for range_start, range_end in ranges:
+                    try:
+                        fetched = fetch(symbol, range_start, range_end)
+                    except Exception:
+                        continue
+
+                    # An empty answer over a long range is not recorded as covered.
+                    # Before the first stored bar (or with none stored) it is the
+                    # symbol not trading yet, so it is negative-cached; a gap at the
+                    # end usually means a failed request, so that is asked again.
+                    if fetched.empty and (range_end - range_start).days > 5:
+                        if covered_end is None or range_end < covered_start:
+                            empty = self._empty_range(meta, range_start, range_end)
+                            meta = dict(meta, empty=empty)
+                        continue
+
+                    if not fetched.empty:
+                        fetched = fetched.copy()
+                        if fetched.index.tz is not None:
+                            fetched.index = fetched.index.tz_localize(None)
+                        fetched.index = fetched.index.normalize().rename('Date')
+                        frames.append(fetched)
+
+                    covered_start = min(covered_start, range_start)
+                    covered_end = max(covered_end or range_end, range_end)
+
+                if covered_end is not None:
+                    if frames:
+                        bars = pd.concat(frames)
+                        bars = bars[~bars.index.duplicated(keep='last')].sort_index()
+                    meta = {
+                        'start': covered_start.isoformat(),
+                        'end': covered_end.isoformat(),
+                        'fetched_at': time.time()
+                    }
+                    if empty:
+                        meta['empty'] = empty
+                    self._save(symbol, bars, meta)
+                elif empty:
+                    self._save(symbol, bars, {'empty': empty})
+
+        if bars.empty:
+            return bars
+        return bars.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+@st.cache_resource
+def get_history_store() -> HistoryStore:
+    """Process-wide history store rooted at PORTFOLIO_DATA_DIR"""
+    data_dir = os.environ.get('PORTFOLIO_DATA_DIR', '.portfolio_data')
+    return HistoryStore(os.path.join(data_dir, 'history'))
+
+class SingleFlight:
+    """Coalesce concurrent loads of the same keys into one upstream call
+
+    The first caller to ask for a key loads it; callers arriving while that
+    load is in flight wait on its Future and share the result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}  # key -> Future
+        self.stats = {'loaded': 0, 'shared': 0}
+
+    def run_many(self, keys: List, loader: Callable[[List], Dict], wait_timeout: float = None) -> Dict:
+        """Load keys once across all concurrent callers; keys nobody could load are omitted"""
+        owned, waiting = [], {}
+        with self._lock:
+            for key in keys:
+                future = self._in_flight.get(key)
+                if future is None:
+                    self._in_flight[key] = Future()
+                    owned.append(key)
+                else:
+                    waiting[key] = future
+            self.stats['loaded'] += len(owned)
+            self.stats['shared'] += len(waiting)
+
+        results = {}
+        if owned:
+            loaded = {}
+            try:
+                loaded = loader(owned)
+            finally:
+                with self._lock:
+                    futures = [self._in_flight.pop(key) for key in owned]
+                for key, future in zip(owned, futures):
+                    future.set_result(loaded.get(key))
+            results.update(loaded)
+
+        for key, future in waiting.items():
+            try:
+                value = future.result(timeout=wait_timeout)
+            except Exception:
+                continue
+            if value is not None:
+                results[key] = value
+        return results
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+class QuoteCache:
+    """Symbol-keyed quote cache with TTL, LRU eviction and stale-while-revalidate
+
+    One instance is shared by every session in the process, and cache
+    misses go through a SingleFlight, so overlapping portfolios trigger a
+    single upstream request per symbol.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 5000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # symbol -> (price, fetched_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'evictions': 0}
+
+    def get_many(self, symbols: List[str], loader: Callable[[List[str]], Dict[str, float]],
+                 wait_timeout: float = None) -> Dict[str, float]:
+        """Return cached prices, loading misses and refreshing stale entries in the background
+
+        Misses already being loaded by another session are waited on (up to
+        wait_timeout) instead of requested again.
+        """
+        now = time.monotonic()
+        prices = {}
+        missing = []
+        stale = []
+
+        with self._lock:
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                if entry is None:
+                    missing.append(symbol)
+                    self.stats['misses'] += 1
+                    continue
+
+                self._entries.move_to_end(symbol)
+                prices[symbol] = entry[0]
+                if now - entry[1] > self.ttl:
+                    self.stats['stale_hits'] += 1
+                    if symbol not in self._refreshing:
+                        stale.append(symbol)
+                else:
+                    self.stats['hits'] += 1
+            self._refreshing.update(stale)
+
+        # Serve stale values now, refresh them off the render path
+        if stale:
+            threading.Thread(target=self._refresh, args=(stale, loader), daemon=True).start()
+
+        if missing:
+            def load_and_store(keys: List[str]) -> Dict[str, float]:
+                fetched = loader(keys)
+                self.put_many(fetched)
+                return fetched
+            prices.update(self._flight.run_many(missing, load_and_store, wait_timeout))
+
+        return prices
+
+    def put_many(self, prices: Dict[str, float]):
+        """Store fresh prices and evict least recently used entries"""
+        now = time.monotonic()
+        with self._lock:
+            for symbol, price in prices.items():
+                self._entries[symbol] = (price, now)
+                self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _refresh(self, symbols: List[str], loader: Callable[[List[str]], Dict[str, float]]):
+        """Background refresh for expired entries"""
+        try:
+            self.put_many(loader(symbols))
+            with self._lock:
+                self.stats['refreshes'] += 1
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(symbols)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Snapshot of cache counters"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        stats['shared_loads'] = self._flight.stats['shared']
+        stats['in_flight'] = self._flight.in_flight()
+        return stats
+
+    def clear(self):
+        """Drop all cached quotes"""
+        with self._lock:
+            self._entries.clear()
+
+@st.cache_resource
+def get_quote_cache() -> QuoteCache:
+    """Process-wide quote cache shared across reruns and sessions"""
+    return QuoteCache(
+        ttl=float(os.environ.get('PORTFOLIO_QUOTE_TTL', '60')),
+        max_size=int(os.environ.get('PORTFOLIO_QUOTE_CACHE_SIZE', '5000'))
+    )
+
+class PriceRefresher:
+    """Background poller that keeps the shared quote cache fresh for live sessions
+
+    Sessions with live prices on register their symbols with watch() on
+    every (fragment) run; symbols not watched for a few intervals drop out.
+    Each poll writes the answers to the quote cache and bumps a per-symbol
+    change version, so a session can tell whether any of its prices moved
+    without comparing them.
+    """
+
+    def __init__(self, provider: MarketDataProvider, quote_cache: QuoteCache, fetcher: PriceFetcher,
+                 interval: float = 30.0):
+        self.provider = provider
+        self.quote_cache = quote_cache
+        self.fetcher = fetcher
+        self.interval = interval
+        self.prices = {}      # symbol -> last polled price
+        self.changed_at = {}  # symbol -> version at which its price last changed
+        self.version = 0
+        self.last_refresh = None
+        self.last_duration = 0.0
+        self._watchers = {}   # session id -> (symbols, last seen)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def watch(self, session_id: str, symbols: List[str]):
+        """Register (or keep alive) a session's symbols and make sure the poller runs"""
+        with self._lock:
+            is_new = any(symbol not in self.prices for symbol in symbols)
+            self._watchers[session_id] = (frozenset(symbols), time.monotonic())
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='price-refresher', daemon=True)
+                self._thread.start()
+        if is_new:
+            self._wakeup.set()
+
+    def watched_symbols(self) -> List[str]:
+        """Symbols of sessions seen within the last three intervals"""
+        cutoff = time.monotonic() - 3 * self.interval
+        with self._lock:
+            self._watchers = {sid: w for sid, w in self._watchers.items() if w[1] >= cutoff}
+            return sorted(set().union(*(w[0] for w in self._watchers.values())))
+
+    def version_for(self, symbols) -> int:
+        """Latest change version among symbols (0 if none has been polled)"""
+        with self._lock:
+            return max((self.changed_at.get(symbol, 0) for symbol in symbols), default=0)
+
+    def refresh_once(self):
+        """Poll every watched symbol in one batched request"""
+        symbols = self.watched_symbols()
+        if not symbols:
+            return
+        start = time.monotonic()
+        prices, _ = self.fetcher.fetch(
+            symbols,
+            self.provider.get_quotes,
+            symbol_timeout=self.interval,
+            deadline=start + self.interval
+        )
+        self.quote_cache.put_many(prices)
+        with self._lock:
+            changed = [symbol for symbol, price in prices.items() if self.prices.get(symbol) != price]
+            if changed:
+                self.version += 1
+                for symbol in changed:
+                    self.prices[symbol] = prices[symbol]
+                    self.changed_at[symbol] = self.version
+            self.last_refresh = datetime.now()
+            self.last_duration = time.monotonic() - start
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.refresh_once()
+            except Exception:
+                pass
+            self._wakeup.wait(max(self.interval - (time.monotonic() - started), 1.0))
+            self._wakeup.clear()
+            self.watched_symbols()  # prune sessions that went away
+            with self._lock:
+                if not self._watchers:
+                    self._thread = None
+                    return
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                'sessions': len(self._watchers),
+                'symbols': len(set().union(*(w[0] for w in self._watchers.values()))) if self._watchers else 0,
+                'version': self.version,
+                'last_refresh': self.last_refresh,
+                'last_duration': self.last_duration
+            }
+
+@st.cache_resource
+def get_price_refresher() -> PriceRefresher:
+    """Process-wide live price poller (PORTFOLIO_REFRESH_INTERVAL seconds)"""
+    return PriceRefresher(
+        get_market_data_provider(),
+        get_quote_cache(),
+        get_price_fetcher(),
+        interval=float(os.environ.get('PORTFOLIO_REFRESH_INTERVAL', '30'))
+    )
+
+HOLDINGS_COLUMNS = [
+    'symbol', 'quantity', 'avg_price', 'current_price',
+    'cost_basis', 'current_value', 'gain', 'gain_percentage'
+]
+
+# Display formats for the Holdings and Transactions tables
+HOLDINGS_COLUMN_CONFIG = {
+    'symbol': st.column_config.TextColumn("Symbol"),
+    'quantity': st.column_config.NumberColumn("Quantity", format="%.2f"),
+    'avg_price': st.column_config.NumberColumn("Avg Price", format="$%.2f"),
+    'current_price': st.column_config.NumberColumn("Current Price", format="$%.2f"),
+    'cost_basis': st.column_config.NumberColumn("Cost Basis", format="dollar"),
+    'current_value': st.column_config.NumberColumn("Current Value", format="dollar"),
+    'gain': st.column_config.NumberColumn("Gain/Loss", format="dollar"),
+    'gain_percentage': st.column_config.NumberColumn("Gain %", format="%.2f%%")
+}
+
+TRANSACTION_COLUMN_CONFIG = {
+    'date': st.column_config.DatetimeColumn("Date", format="YYYY-MM-DD HH:mm:ss"),
+    'symbol': st.column_config.TextColumn("Symbol"),
+    'action': st.column_config.TextColumn("Action"),
+    'quantity': st.column_config.NumberColumn("Quantity", format="%.2f"),
+    'price': st.column_config.NumberColumn("Price", format="$%.2f"),
+    'total': st.column_config.NumberColumn("Total", format="$%.2f"),
+    'relief': st.column_config.TextColumn("Lot Relief")
+}
+
+def holdings_to_arrays(portfolio: Dict[str, Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Columnar view of the portfolio: symbol, quantity and avg_price arrays"""
+    count = len(portfolio)
+    symbols = np.array(list(portfolio.keys()), dtype=object)
+    quantity = np.fromiter((data['quantity'] for data in portfolio.values()), dtype=np.float64, count=count)
+    avg_price = np.fromiter((data['avg_price'] for data in portfolio.values()), dtype=np.float64, count=count)
+    return symbols, quantity, avg_price
+
+def value_holdings(symbols: np.ndarray, quantity: np.ndarray, avg_price: np.ndarray,
+                   current_price: np.ndarray) -> pd.DataFrame:
+    """Cost basis, value, gain and gain % for all holdings in one vectorized pass"""
+    cost_basis = quantity * avg_price
+    current_value = quantity * current_price
+    gain = current_value - cost_basis
+    gain_percentage = np.divide(gain, cost_basis, out=np.zeros_like(gain), where=cost_basis > 0) * 100
+
+    return pd.DataFrame({
+        'symbol': symbols,
+        'quantity': quantity,
+        'avg_price': avg_price,
+        'current_price': current_price,
+        'cost_basis': cost_basis,
+        'current_value': current_value,
+        'gain': gain,
+        'gain_percentage': gain_percentage
+    }, columns=HOLDINGS_COLUMNS)
+
+def apply_transaction(portfolio: Dict[str, Dict], transaction: Dict):
+    """Apply one BUY/SELL to a holdings dict (quantity and weighted average cost)
+
+    Realized P&L and the cost left after a SELL come from the tax lots;
+    see replay_ledger.
+    """
+    symbol = transaction['symbol']
+    quantity = transaction['quantity']
+
+    if transaction['action'] == 'BUY':
+        if symbol in portfolio:
+            # Update existing holding
+            old_qty = portfolio[symbol]['quantity']
+            old_avg = portfolio[symbol]['avg_price']
+
+            new_qty = old_qty + quantity
+            new_avg = ((old_qty * old_avg) + (quantity * transaction['price'])) / new_qty
+
+            portfolio[symbol]['quantity'] = new_qty
+            portfolio[symbol]['avg_price'] = new_avg
+        else:
+            # Add new holding
+            portfolio[symbol] = {
+                'quantity': quantity,
+                'avg_price': transaction['price'],
+                'purchase_date': transaction['date'][:10]
+            }
+    elif symbol in portfolio:
+        if quantity >= portfolio[symbol]['quantity']:
+            del portfolio[symbol]
+        else:
+            portfolio[symbol]['quantity'] -= quantity
+
+class LedgerAggregates:
+    """Running transaction summary maintained at write time
+
+    Counts, volume and realized P&L per symbol are updated as each
+    transaction is committed, so reading them never scans the ledger.
+    Realized P&L is the lot book's; unrealized P&L is derived per symbol
+    from the open holding, whose average cost follows the open lots.
+    """
+
+    def __init__(self):
+        self.buy_count = 0
+        self.sell_count = 0
+        self.total_volume = 0.0
+        self.total_realized = 0.0
+        self.realized = {}  # symbol -> realized P&L
+
+    def record(self, transaction: Dict, realized_pnl: float = 0.0):
+        """Fold one committed transaction into the aggregates"""
+        if transaction['action'] == 'BUY':
+            self.buy_count += 1
+        else:
+            self.sell_count += 1
+            symbol = transaction['symbol']
+            self.realized[symbol] = self.realized.get(symbol, 0.0) + realized_pnl
+            self.total_realized += realized_pnl
+        self.total_volume += transaction['total']
+
+    def record_batch(self, buy_count: int, sell_count: int, volume: float, realized_by_symbol: Dict[str, float]):
+        """Fold a pre-aggregated batch (bulk import) into the aggregates"""
+        self.buy_count += buy_count
+        self.sell_count += sell_count
+        self.total_volume += volume
+        for symbol, pnl in realized_by_symbol.items():
+            self.realized[symbol] = self.realized.get(symbol, 0.0) + pnl
+            self.total_realized += pnl
+
+    def symbol_pnl(self, symbol: str, holding: Dict = None, price: float = 0.0) -> Dict[str, float]:
+        """Realized and unrealized P&L for one symbol"""
+        unrealized = holding['quantity'] * (price - holding['avg_price']) if holding else 0.0
+        return {'realized': self.realized.get(symbol, 0.0), 'unrealized': unrealized}
+
+    def to_dict(self) -> Dict:
+        return {
+            'buy_count': self.buy_count,
+            'sell_count': self.sell_count,
+            'total_volume': self.total_volume,
+            'total_realized': self.total_realized,
+            'realized': self.realized
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LedgerAggregates':
+        aggregates = cls()
+        aggregates.buy_count = data.get('buy_count', 0)
+        aggregates.sell_count = data.get('sell_count', 0)
+        aggregates.total_volume = data.get('total_volume', 0.0)
+        aggregates.total_realized = data.get('total_realized', 0.0)
+        aggregates.realized = dict(data.get('realized', {}))
+        return aggregates
+
+    @classmethod
+    def rebuild(cls, batches: Iterable[List[Dict]]) -> 'LedgerAggregates':
+        """Recompute the aggregates by replaying the full ledger, in ordered batches, through a fresh lot book"""
+        aggregates, holdings, lot_book = cls(), {}, LotBook()
+        for transactions in batches:
+            replay_ledger(holdings, aggregates, lot_book, transactions)
+        return aggregates
+
+    def verify(self, batches: Iterable[List[Dict]], tolerance: float = 1e-6) -> List[str]:
+        """Compare against a full rebuild; returns a description of each mismatch"""
+        expected = self.rebuild(batches)
+        mismatches = []
+        for field in ['buy_count', 'sell_count', 'total_volume', 'total_realized']:
+            actual_value, expected_value = getattr(self, field), getattr(expected, field)
+            if abs(actual_value - expected_value) > tolerance * max(1.0, abs(expected_value)):
+                mismatches.append(f"{field}: {actual_value} != {expected_value}")
+        for symbol in set(self.realized) | set(expected.realized):
+            actual_value, expected_value = self.realized.get(symbol, 0.0), expected.realized.get(symbol, 0.0)
+            if abs(actual_value - expected_value) > tolerance * max(1.0, abs(expected_value)):
+                mismatches.append(f"realized[{symbol}]: {actual_value} != {expected_value}")
+        return mismatches
+
+LOT_METHODS = ['FIFO', 'LIFO', 'Specific lots']
+
+def parse_relief(relief: str = None) -> Tuple[str, List[int]]:
+    """Split a ledger relief instruction into (method, lot ids); FIFO when unset"""
+    if not relief:
+        return 'FIFO', []
+    if relief.startswith('SPECIFIC:'):
+        return 'Specific lots', [int(lot_id) for lot_id in relief[len('SPECIFIC:'):].split(',') if lot_id]
+    return relief, []
+
+def format_relief(method: str, lot_ids: List[int] = None) -> str:
+    """Ledger relief instruction for a SELL"""
+    if method == 'Specific lots':
+        return 'SPECIFIC:' + ','.join(str(int(lot_id)) for lot_id in lot_ids or [])
+    return method
+
+class TaxLots:
+    """Open lots of one symbol kept in growable parallel numpy arrays
+
+    Lots live in [head, size), ordered by acquisition date (then lot id).
+    FIFO relief advances head and LIFO relief shrinks size, each touching
+    only the lots it consumes; specific-lot relief zeroes lots in place,
+    found by binary search on the lot ids while those are still in order.
+    """
+
+    epsilon = 1e-9
+
+    def __init__(self, capacity: int = 16):
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.quantity = np.empty(capacity, dtype=np.float64)
+        self.price = np.empty(capacity, dtype=np.float64)
+        self.acquired = np.empty(capacity, dtype='datetime64[s]')
+        self.head = 0
+        self.size = 0
+        self.ids_sorted = True
+
+    def _reserve(self, count: int):
+        """Make room for count more lots, compacting consumed lots first"""
+        if self.size + count <= len(self.ids):
+            return
+        live = self.size - self.head
+        capacity = len(self.ids)
+        while live + count > capacity // 2:
+            capacity *= 2
+        for name in ('ids', 'quantity', 'price', 'acquired'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:live] = old[self.head:self.size]
+            setattr(self, name, new)
+        self.head, self.size = 0, live
+
+    def add_many(self, ids, quantity, price, acquired):
+        """Add new lots in acquisition order
+
+        Lots acquired no earlier than the last open lot are appended. A
+        backdated block (an imported trade history) is merged in, so FIFO
+        and LIFO follow the dates the shares were bought, not ledger order.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        acquired = np.asarray(acquired, dtype='datetime64[s]')
+        order = np.lexsort((ids, acquired))
+        ids, acquired = ids[order], acquired[order]
+        quantity = np.asarray(quantity, dtype=np.float64)[order]
+        price = np.asarray(price, dtype=np.float64)[order]
+        count = len(ids)
+        if not count:
+            return
+
+        if self.size > self.head and acquired[0] < self.acquired[self.size - 1]:
+            live = slice(self.head, self.size)
+            ids = np.concatenate([self.ids[live], ids])
+            acquired = np.concatenate([self.acquired[live], acquired])
+            quantity = np.concatenate([self.quantity[live], quantity])
+            price = np.concatenate([self.price[live], price])
+            order = np.lexsort((ids, acquired))
+            ids, acquired, quantity, price = ids[order], acquired[order], quantity[order], price[order]
+            self.head = self.size = 0
+            self.ids_sorted = True
+            count = len(ids)
+
+        self._reserve(count)
+        if self.ids_sorted:
+            self.ids_sorted = bool((np.diff(ids) > 0).all()) and (self.size == self.head or ids[0] > self.ids[self.size - 1])
+        end = self.size + count
+        self.ids[self.size:end] = ids
+        self.quantity[self.size:end] = quantity
+        self.price[self.size:end] = price
+        self.acquired[self.size:end] = acquired
+        self.size = end
+
+    def open_quantity(self) -> float:
+        return float(self.quantity[self.head:self.size].sum())
+
+    def unrealized(self, market_price: float) -> float:
+        """Unrealized P&L of the open lots at market_price"""
+        open_qty = self.quantity[self.head:self.size]
+        return float(open_qty @ (market_price - self.price[self.head:self.size]))
+
+    def _consume(self, quantity: np.ndarray, price: np.ndarray, remaining: float, sale_price: float) -> Tuple[float, float]:
+        """Take up to remaining shares from the lots in order, in place"""
+        cumulative = np.cumsum(quantity)
+        if cumulative[-1] <= remaining + self.epsilon:
+            realized = float(quantity @ (sale_price - price))
+            quantity[:] = 0.0
+            return realized, max(remaining - float(cumulative[-1]), 0.0)
+        last = int(np.searchsorted(cumulative, remaining - self.epsilon))
+        taken = quantity[:last + 1].copy()
+        taken[last] = remaining - (cumulative[last - 1] if last else 0.0)
+        quantity[:last + 1] -= taken
+        return float(taken @ (sale_price - price[:last + 1])), 0.0
+
+    def _trim(self):
+        """Drop fully relieved lots from both ends of the live range"""
+        while self.head < self.size and self.quantity[self.head] <= self.epsilon:
+            live = self.quantity[self.head:min(self.head + 1024, self.size)] > self.epsilon
+            self.head += int(live.argmax()) if live.any() else len(live)
+        while self.size > self.head and self.quantity[self.size - 1] <= self.epsilon:
+            live = self.quantity[max(self.size - 1024, self.head):self.size][::-1] > self.epsilon
+            self.size -= int(live.argmax()) if live.any() else len(live)
+        if self.head == self.size:
+            self.head = self.size = 0
+            self.ids_sorted = True
+
+    def relieve(self, quantity: float, sale_price: float, method: str = 'FIFO', lot_ids: List[int] = None) -> float:
+        """Sell quantity shares by the given method, returning the realized P&L"""
+        realized, remaining = 0.0, float(quantity)
+        if method == 'Specific lots':
+            wanted = pd.unique(np.asarray(lot_ids, dtype=np.int64))
+            if self.ids_sorted:
+                positions = self.head + np.searchsorted(self.ids[self.head:self.size], wanted)
+                found = positions < self.size
+                found[found] = self.ids[positions[found]] == wanted[found]
+                positions = positions[found]
+            else:
+                positions = self.head + np.flatnonzero(np.isin(self.ids[self.head:self.size], wanted))
+            if len(positions):
+                selected = self.quantity[positions]
+                realized, remaining = self._consume(selected, self.price[positions], remaining, sale_price)
+                self.quantity[positions] = selected
+        else:
+            # Widen the window geometrically so a sale touches only the lots it consumes
+            window = 64
+            while remaining > self.epsilon and self.size > self.head:
+                if method == 'LIFO':
+                    start = max(self.size - window, self.head)
+                    part, remaining = self._consume(
+                        self.quantity[start:self.size][::-1], self.price[start:self.size][::-1], remaining, sale_price)
+                else:
+                    end = min(self.head + window, self.size)
+                    part, remaining = self._consume(
+                        self.quantity[self.head:end], self.price[self.head:end], remaining, sale_price)
+                realized += part
+                self._trim()
+                window *= 2
+        self._trim()
+        return realized
+
+    def out_of_order(self) -> int:
+        """Number of adjacent open lots not in (acquired, lot id) order; 0 when FIFO/LIFO are sound"""
+        acquired, ids = self.acquired[self.head:self.size], self.ids[self.head:self.size]
+        later = acquired[:-1] > acquired[1:]
+        tied = (acquired[:-1] == acquired[1:]) & (ids[:-1] > ids[1:])
+        return int((later | tied).sum())
+
+    def frame(self) -> pd.DataFrame:
+        """Open lots as a DataFrame"""
+        live = slice(self.head, self.size)
+        frame = pd.DataFrame({
+            'lot_id': self.ids[live],
+            'acquired': self.acquired[live],
+            'quantity': self.quantity[live],
+            'price': self.price[live]
+        })
+        return frame[frame['quantity'] > self.epsilon].reset_index(drop=True)
+
+class LotBook:
+    """Tax-lot positions for every symbol, built from the transaction ledger
+
+    Each BUY opens a lot whose id is its ledger row id, placed by its
+    acquisition date. Each SELL relieves lots by the method recorded on
+    it (FIFO when none is), and the realized P&L per symbol accumulates
+    as it goes.
+    """
+
+    def __init__(self):
+        self.lots = {}  # symbol -> TaxLots
+        self.realized = {}  # symbol -> realized P&L
+
+    def apply_many(self, transactions: List[Dict]) -> List[float]:
+        """Apply ledger transactions (with their row ids) in order, returning each one's realized P&L
+
+        Consecutive buys of a symbol are buffered and appended as one block,
+        so long runs of purchases (DRIP) cost one array copy.
+        """
+        pending = defaultdict(lambda: ([], [], [], []))
+        realized = []
+
+        def flush(symbol):
+            ids, quantity, price, acquired = pending.pop(symbol)
+            if symbol not in self.lots:
+                self.lots[symbol] = TaxLots(capacity=max(16, len(ids)))
+            self.lots[symbol].add_many(ids, quantity, price, np.array(acquired, dtype='datetime64[s]'))
+
+        for transaction in transactions:
+            symbol = transaction['symbol']
+            if transaction['action'] == 'BUY':
+                buffer = pending[symbol]
+                buffer[0].append(transaction['id'])
+                buffer[1].append(transaction['quantity'])
+                buffer[2].append(transaction['price'])
+                buffer[3].append(transaction['date'].replace(' ', 'T'))
+                realized.append(0.0)
+                continue
+            if symbol in pending:
+                flush(symbol)
+            pnl = 0.0
+            if symbol in self.lots:
+                method, lot_ids = parse_relief(transaction.get('relief'))
+                pnl = self.lots[symbol].relieve(transaction['quantity'], transaction['price'], method, lot_ids)
+            self.realized[symbol] = self.realized.get(symbol, 0.0) + pnl
+            realized.append(pnl)
+
+        for symbol in list(pending):
+            flush(symbol)
+        return realized
+
+    def apply(self, transaction: Dict) -> float:
+        """Apply one ledger transaction"""
+        return self.apply_many([transaction])[0]
+
+    def to_bytes(self) -> bytes:
+        """Open lots and realized P&L as one .npz blob (stored in ledger snapshots)"""
+        symbols = list(self.lots)
+        columns = {name: [] for name in ('ids', 'quantity', 'price', 'acquired')}
+        for symbol in symbols:
+            lots = self.lots[symbol]
+            for name, parts in columns.items():
+                parts.append(getattr(lots, name)[lots.head:lots.size])
+        empty = TaxLots(capacity=0)
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            symbols=np.array(symbols, dtype=str),
+            counts=np.array([len(part) for part in columns['ids']], dtype=np.int64),
+            realized_symbols=np.array(list(self.realized), dtype=str),
+            realized=np.array(list(self.realized.values()), dtype=np.float64),
+            **{name: np.concatenate(parts) if parts else getattr(empty, name) for name, parts in columns.items()}
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'LotBook':
+        data = np.load(io.BytesIO(blob))
+        book = cls()
+        ends = np.cumsum(data['counts'])
+        ids, quantity, price, acquired = data['ids'], data['quantity'], data['price'], data['acquired']
+        for symbol, end, count in zip(data['symbols'].tolist(), ends.tolist(), data['counts'].tolist()):
+            lots = TaxLots(capacity=max(16, count))
+            lots.add_many(ids[end - count:end], quantity[end - count:end], price[end - count:end], acquired[end - count:end])
+            book.lots[symbol] = lots
+        book.realized = dict(zip(data['realized_symbols'].tolist(), data['realized'].tolist()))
+        return book
+
+    @classmethod
+    def from_transactions(cls, transactions: List[Dict]) -> 'LotBook':
+        book = cls()
+        book.apply_many(transactions)
+        return book
+
+    def reprice(self, holdings: Dict[str, Dict], symbols):
+        """Set the average cost of these holdings to that of their open lots
+
+        Lot relief decides which cost a sale takes with it, so after a
+        sale the holding's average follows the lots that are left.
+        """
+        for symbol in symbols:
+            lots = self.lots.get(symbol)
+            if symbol not in holdings or lots is None:
+                continue
+            quantity = lots.quantity[lots.head:lots.size]
+            held = quantity.sum()
+            if held > lots.epsilon:
+                holdings[symbol]['avg_price'] = float(quantity @ lots.price[lots.head:lots.size] / held)
+
+    def verify(self) -> List[str]:
+        """Describe every symbol whose open lots are not in acquisition order"""
+        mismatches = []
+        for symbol, lots in self.lots.items():
+            count = lots.out_of_order()
+            if count:
+                mismatches.append(f"lots[{symbol}]: {count} lots out of acquisition order")
+        return mismatches
+
+    def open_lots(self, symbol: str) -> pd.DataFrame:
+        """Open lots of one symbol"""
+        if symbol not in self.lots:
+            return pd.DataFrame(columns=['lot_id', 'acquired', 'quantity', 'price'])
+        return self.lots[symbol].frame()
+
+    def summary(self, prices: Dict[str, float]) -> pd.DataFrame:
+        """Open quantity, lot count, realized and unrealized P&L per symbol"""
+        rows = []
+        for symbol in sorted(set(self.lots) | set(self.realized)):
+            lots = self.lots.get(symbol)
+            open_qty = lots.open_quantity() if lots else 0.0
+            rows.append({
+                'symbol': symbol,
+                'open_lots': int((lots.quantity[lots.head:lots.size] > lots.epsilon).sum()) if lots else 0,
+                'open_quantity': open_qty,
+                'realized': self.realized.get(symbol, 0.0),
+                'unrealized': lots.unrealized(prices[symbol]) if lots and symbol in prices else 0.0
+            })
+        return pd.DataFrame(rows, columns=['symbol', 'open_lots', 'open_quantity', 'realized', 'unrealized'])
+
+def replay_ledger(holdings: Dict[str, Dict], aggregates: LedgerAggregates, lot_book: LotBook,
+                  transactions: List[Dict]):
+    """Fold ledger transactions (with their row ids) into holdings, aggregates and lots
+
+    The lot book prices every sale, so realized P&L, the holdings' average
+    cost and the Tax Lots table always agree.
+    """
+    sold = set()
+    for transaction, realized_pnl in zip(transactions, lot_book.apply_many(transactions)):
+        apply_transaction(holdings, transaction)
+        aggregates.record(transaction, realized_pnl)
+        if transaction['action'] == 'SELL':
+            sold.add(transaction['symbol'])
+    lot_book.reprice(holdings, sold)
+
+TRANSACTION_FIELDS = ['date', 'symbol', 'action', 'quantity', 'price', 'total']
+LEDGER_EXPORT_COLUMNS = TRANSACTION_FIELDS + ['relief']
+
+class PortfolioStore:
+    """Durable SQLite (WAL) transaction ledger with compacted holdings snapshots
+
+    Every transaction is appended to the ledger as it happens. Every
+    snapshot_interval transactions a session's holdings, ledger aggregates
+    and open tax lots are written as a snapshot stamped with the last
+    ledger id they include, so a cold start replays only the transactions
+    after it.
+    One database holds many portfolios; a store reads and writes only the
+    rows of its own portfolio_id.
+    """
+
+    snapshot_interval = 500
+
+    def __init__(self, path: str, portfolio_id: str = 'default'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.portfolio_id = portfolio_id
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                portfolio TEXT NOT NULL DEFAULT 'default',
+                date TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                action TEXT NOT NULL,
+                quantity REAL NOT NULL,
+                price REAL NOT NULL,
+                total REAL NOT NULL,
+                relief TEXT
+            );
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                portfolio TEXT NOT NULL DEFAULT 'default',
+                last_txn_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                holdings TEXT NOT NULL,
+                aggregates TEXT,
+                lots BLOB
+            );
+        """)
+        # Ledgers written before aggregates, tax lots and portfolios existed
+        snapshot_columns = [row[1] for row in self._conn.execute("PRAGMA table_info(snapshots)")]
+        if 'aggregates' not in snapshot_columns:
+            self._conn.execute("ALTER TABLE snapshots ADD COLUMN aggregates TEXT")
+        if 'portfolio' not in snapshot_columns:
+            self._conn.execute("ALTER TABLE snapshots ADD COLUMN portfolio TEXT NOT NULL DEFAULT 'default'")
+        if 'lots' not in snapshot_columns:
+            self._conn.execute("ALTER TABLE snapshots ADD COLUMN lots BLOB")
+        transaction_columns = [row[1] for row in self._conn.execute("PRAGMA table_info(transactions)")]
+        if 'relief' not in transaction_columns:
+            self._conn.execute("ALTER TABLE transactions ADD COLUMN relief TEXT")
+        if 'portfolio' not in transaction_columns:
+            self._conn.execute("ALTER TABLE transactions ADD COLUMN portfolio TEXT NOT NULL DEFAULT 'default'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS transactions_portfolio ON transactions (portfolio, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS snapshots_portfolio ON snapshots (portfolio, last_txn_id)")
+        schema_version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version < 1:
+            self._renumber_specific_lots()
+        if schema_version < 2:
+            # Snapshots priced sales at average cost; rebuild them from the lots
+            self._conn.execute("DELETE FROM snapshots")
+            self._conn.execute("PRAGMA user_version = 2")
+        self._conn.commit()
+
+    def _renumber_specific_lots(self):
+        """Rewrite specific-lot reliefs from ledger positions (the old lot ids) to row ids"""
+        for (portfolio,) in self._conn.execute(
+                "SELECT DISTINCT portfolio FROM transactions WHERE relief LIKE 'SPECIFIC:%'").fetchall():
+            row_ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM transactions WHERE portfolio = ? ORDER BY id", (portfolio,))]
+            for txn_id, relief in self._conn.execute(
+                    "SELECT id, relief FROM transactions WHERE portfolio = ? AND relief LIKE 'SPECIFIC:%'",
+                    (portfolio,)).fetchall():
+                method, positions = parse_relief(relief)
+                lot_ids = [row_ids[position] for position in positions if 0 <= position < len(row_ids)]
+                self._conn.execute("UPDATE transactions SET relief = ? WHERE id = ?",
+                                   (format_relief(method, lot_ids), txn_id))
+
+    def append(self, transaction: Dict) -> Tuple[int, List[int]]:
+        """Append one transaction"""
+        return self.append_many([transaction])
+
+    def append_many(self, transactions: List[Dict]) -> Tuple[int, List[int]]:
+        """Append transactions in a single SQLite transaction
+
+        Returns the id of this portfolio's newest row before the write, so
+        a caller can tell whether anyone else wrote since it last looked,
+        and the ids of the new rows.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            previous_id = self._last_transaction_id()
+            self._conn.executemany(
+                "INSERT INTO transactions (portfolio, date, symbol, action, quantity, price, total, relief) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ([self.portfolio_id] + [t[field] for field in TRANSACTION_FIELDS] + [t.get('relief')] for t in transactions)
+            )
+            # The write lock is held, so the new ids are the newest in the table
+            last_id = self._conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0]
+        return previous_id, list(range(last_id - len(transactions) + 1, last_id + 1))
+
+    def _last_transaction_id(self) -> int:
+        """Id of this portfolio's newest ledger row"""
+        row = self._conn.execute("SELECT MAX(id) FROM transactions WHERE portfolio = ?", (self.portfolio_id,)).fetchone()
+        return row[0] or 0
+
+    def first_transaction_id(self) -> int:
+        """Id of this portfolio's oldest ledger row (it changes only when the ledger is cleared)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(id) FROM transactions WHERE portfolio = ?", (self.portfolio_id,)
+            ).fetchone()
+        return row[0] or 0
+
+    def _last_snapshot_id(self) -> int:
+        """Ledger id covered by the most recent snapshot"""
+        row = self._conn.execute(
+            "SELECT MAX(last_txn_id) FROM snapshots WHERE portfolio = ?", (self.portfolio_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    def _write_snapshot(self, last_txn_id: int, holdings: Dict[str, Dict], aggregates: LedgerAggregates,
+                        lot_book: LotBook):
+        """Store a compacted holdings snapshot and drop the older ones"""
+        self._conn.execute(
+            "INSERT INTO snapshots (portfolio, last_txn_id, created_at, holdings, aggregates, lots) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (self.portfolio_id, last_txn_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+             json.dumps(holdings), json.dumps(aggregates.to_dict()), lot_book.to_bytes())
+        )
+        self._conn.execute(
+            "DELETE FROM snapshots WHERE portfolio = ? AND last_txn_id < ?", (self.portfolio_id, last_txn_id)
+        )
+
+    def snapshot(self, last_txn_id: int, holdings: Dict[str, Dict], aggregates: LedgerAggregates, lot_book: LotBook):
+        """Snapshot holdings, aggregates and lots that include the ledger up to last_txn_id"""
+        with self._lock, self._conn:
+            self._write_snapshot(last_txn_id, holdings, aggregates, lot_book)
+
+    def snapshot_if_due(self, last_txn_id: int, holdings: Dict[str, Dict], aggregates: LedgerAggregates,
+                        lot_book: LotBook):
+        """Snapshot once snapshot_interval ids have passed since the last snapshot"""
+        with self._lock, self._conn:
+            if last_txn_id - self._last_snapshot_id() >= self.snapshot_interval:
+                self._write_snapshot(last_txn_id, holdings, aggregates, lot_book)
+
+    def _iter_records(self, conn: sqlite3.Connection, after_id: int = 0, chunk_size: int = 50000):
+        """Yield ledger records (with row id, and relief when set) after after_id, in ordered batches"""
+        cursor = conn.execute(
+            "SELECT id, date, symbol, action, quantity, price, total, relief FROM transactions "
+            "WHERE portfolio = ? AND id > ? ORDER BY id",
+            (self.portfolio_id, after_id)
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            records = []
+            for values in rows:
+                record = dict(zip(TRANSACTION_FIELDS, values[1:7]), id=values[0])
+                if values[7]:
+                    record['relief'] = values[7]
+                records.append(record)
+            yield records
+
+    def load(self) -> Tuple[Dict[str, Dict], LedgerAggregates, LotBook, int]:
+        """Holdings, aggregates, lots and the last ledger id for a new session
+
+        All three come from the latest snapshot with the ledger tail after
+        it replayed on top.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_txn_id, holdings, aggregates, lots FROM snapshots WHERE portfolio = ? "
+                "ORDER BY last_txn_id DESC LIMIT 1",
+                (self.portfolio_id,)
+            ).fetchone()
+            # Older snapshots carry no aggregates or lots; replay the whole ledger once then
+            if row and row[2] and row[3]:
+                last_txn_id, holdings = row[0], json.loads(row[1])
+                aggregates, lot_book = LedgerAggregates.from_dict(json.loads(row[2])), LotBook.from_bytes(row[3])
+            else:
+                last_txn_id, holdings, aggregates, lot_book = 0, {}, LedgerAggregates(), LotBook()
+
+            for records in self._iter_records(self._conn, after_id=last_txn_id):
+                replay_ledger(holdings, aggregates, lot_book, records)
+                last_txn_id = records[-1]['id']
+        return holdings, aggregates, lot_book, last_txn_id
+
+    def iter_records(self, chunk_size: int = 50000):
+        """Yield the whole ledger as batches of records from a separate read connection"""
+        conn = sqlite3.connect(self.path)
+        try:
+            yield from self._iter_records(conn, chunk_size=chunk_size)
+        finally:
+            conn.close()
+
+    def page_transactions(self, offset: int, limit: int) -> pd.DataFrame:
+        """One page of the ledger, in ledger order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, symbol, action, quantity, price, total, relief FROM transactions "
+                "WHERE portfolio = ? ORDER BY id LIMIT ? OFFSET ?",
+                (self.portfolio_id, limit, offset)
+            ).fetchall()
+        return pd.DataFrame.from_records(rows, columns=LEDGER_EXPORT_COLUMNS)
+
+    def iter_transactions(self, chunk_size: int = 50000, after_id: int = 0, through_id: int = None,
+                          since: str = ''):
+        """Yield the ledger as DataFrame chunks from a separate read connection
+
+        after_id, through_id and since (a date string) narrow it to the
+        rows with after_id < id <= through_id dated on or after since.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(
+                "SELECT date, symbol, action, quantity, price, total, relief FROM transactions "
+                "WHERE portfolio = ? AND id > ? AND id <= ? AND date >= ? ORDER BY id",
+                (self.portfolio_id, after_id, through_id if through_id is not None else sys.maxsize, since)
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                chunk = pd.DataFrame.from_records(rows, columns=LEDGER_EXPORT_COLUMNS)
+                # Buys have no relief; keep the column a string in every chunk
+                chunk['relief'] = chunk['relief'].astype('string')
+                yield chunk
+        finally:
+            conn.close()
+
+    def clear(self):
+        """Delete this portfolio's ledger and snapshots"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM transactions WHERE portfolio = ?", (self.portfolio_id,))
+            self._conn.execute("DELETE FROM snapshots WHERE portfolio = ?", (self.portfolio_id,))
+
+@st.cache_resource(max_entries=64)
+def get_portfolio_store(portfolio_id: str = 'default') -> PortfolioStore:
+    """Ledger of one portfolio in the process-wide database under PORTFOLIO_DATA_DIR"""
+    data_dir = os.environ.get('PORTFOLIO_DATA_DIR', '.portfolio_data')
+    return PortfolioStore(os.path.join(data_dir, 'portfolio.db'), portfolio_id)
+
+def current_portfolio_id() -> str:
+    """Portfolio this session works on: ?portfolio= in the URL, else PORTFOLIO_ID, else a new one
+
+    The id is written back to the URL, so bookmarking the page reopens
+    the same portfolio.
+    """
+    if 'portfolio_id' not in st.session_state:
+        requested = st.query_params.get('portfolio') or os.environ.get('PORTFOLIO_ID', '')
+        st.session_state.portfolio_id = re.sub(r'[^A-Za-z0-9_-]', '', requested)[:64] or os.urandom(6).hex()
+    if st.query_params.get('portfolio') != st.session_state.portfolio_id:
+        st.query_params['portfolio'] = st.session_state.portfolio_id
+    return st.session_state.portfolio_id
+
+# Column names accepted by the bulk importer, mapped to ledger fields
+IMPORT_COLUMN_ALIASES = {
+    'symbol': 'symbol', 'ticker': 'symbol', 'instrument': 'symbol', 'security': 'symbol',
+    'quantity': 'quantity', 'qty': 'quantity', 'shares': 'quantity', 'units': 'quantity',
+    'price': 'price', 'trade price': 'price', 'fill price': 'price', 'avg_price': 'price', 'cost': 'price',
+    'action': 'action', 'side': 'action', 'type': 'action', 'transaction type': 'action', 'buy/sell': 'action',
+    'date': 'date', 'trade date': 'date', 'timestamp': 'date', 'time': 'date', 'settlement date': 'date'
+}
+
+BUY_ACTIONS = {'BUY', 'B', 'BOT', 'BOUGHT'}
+SELL_ACTIONS = {'SELL', 'S', 'SLD', 'SOLD'}
+
+def read_trades_file(source, file_name: str) -> pd.DataFrame:
+    """Read a CSV, JSON or JSON Lines trade file (including this app's JSON export)"""
+    name = file_name.lower()
+    if name.endswith('.jsonl') or name.endswith('.ndjson'):
+        return pd.read_json(source, lines=True)
+    if name.endswith('.json'):
+        data = json.load(source)
+        if isinstance(data, dict):
+            data = data.get('transactions', data.get('holdings', []))
+        return pd.DataFrame(data)
+    return pd.read_csv(source)
+
+def normalize_trades(raw: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """Map broker columns onto ledger fields and drop unusable rows
+
+    Returns the trades sorted by date plus the number of rows skipped.
+    Prices may be NaN (to be filled from live quotes).
+    """
+    renamed = raw.rename(columns=lambda c: IMPORT_COLUMN_ALIASES.get(str(c).strip().lower(), str(c).strip().lower()))
+    renamed = renamed.loc[:, ~renamed.columns.duplicated()]
+    if 'symbol' not in renamed or 'quantity' not in renamed:
+        raise ValueError("Import file needs at least symbol and quantity columns")
+
+    trades = pd.DataFrame({
+        'symbol': renamed['symbol'].astype(str).str.upper().str.strip(),
+        'quantity': pd.to_numeric(renamed['quantity'], errors='coerce'),
+        'price': pd.to_numeric(renamed['price'], errors='coerce') if 'price' in renamed else np.nan,
+        'action': renamed['action'].fillna('').astype(str).str.upper().str.strip() if 'action' in renamed else '',
+        'date': pd.to_datetime(renamed['date'], errors='coerce') if 'date' in renamed else pd.Timestamp.now()
+    })
+
+    # Brokers write sells as SELL/S/SLD or as negative quantities; a blank action
+    # goes by the sign. Other codes (DIVIDEND, SPLIT, FEE, ...) are not trades.
+    action = trades['action']
+    known = action.isin(BUY_ACTIONS) | action.isin(SELL_ACTIONS) | action.eq('')
+    trades['action'] = np.where(action.isin(SELL_ACTIONS) | (trades['quantity'] < 0), 'SELL', 'BUY')
+    trades['quantity'] = trades['quantity'].abs()
+    trades['date'] = trades['date'].fillna(pd.Timestamp.now())
+
+    valid = known & trades['symbol'].str.len().gt(0) & trades['symbol'].ne('NAN') & trades['quantity'].gt(0)
+    trades = trades[valid].sort_values('date', kind='stable').reset_index(drop=True)
+    return trades, int((~valid).sum())
+
+def drop_oversells(portfolio: Dict[str, Dict], trades: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """Drop sells that exceed the position held at that point in the trades
+
+    Returns the remaining trades plus the number of sells dropped. The
+    running position is a grouped cumulative sum; only symbols where it
+    goes negative are walked trade by trade, since dropping one sell
+    changes the position every later sell of that symbol sees.
+    """
+    is_buy = trades['action'].to_numpy() == 'BUY'
+    qty = trades['quantity'].to_numpy(dtype=np.float64)
+    trade_symbols = trades['symbol'].to_numpy()
+    held = {symbol: holding['quantity'] for symbol, holding in portfolio.items()}
+
+    start_qty = pd.Series(trade_symbols).map(held).fillna(0.0).to_numpy()
+    running = start_qty + pd.Series(np.where(is_buy, qty, -qty)).groupby(trade_symbols).cumsum().to_numpy()
+    oversold = set(trade_symbols[running < -TaxLots.epsilon])
+    if not oversold:
+        return trades, 0
+
+    keep = np.ones(len(trades), dtype=bool)
+    position = {symbol: held.get(symbol, 0.0) for symbol in oversold}
+    for row in np.flatnonzero(pd.Series(trade_symbols).isin(oversold).to_numpy()):
+        symbol = trade_symbols[row]
+        if is_buy[row]:
+            position[symbol] += qty[row]
+        elif qty[row] > position[symbol] + TaxLots.epsilon:
+            keep[row] = False
+        else:
+            position[symbol] -= qty[row]
+    return trades[keep], int((~keep).sum())
+
+def merge_trades(portfolio: Dict[str, Dict], trades: pd.DataFrame) -> Dict[str, Dict]:
+    """Merge priced trades into holdings with grouped, vectorized weighted averages
+
+    While a symbol's buys all come before its sells the new average is
+    (existing cost + bought cost) / (existing + bought qty). Symbols that
+    buy again after a sell, or whose position closes out along the way,
+    are replayed trade by trade instead. Symbols with sales are re-priced
+    from their tax lots afterwards (LotBook.reprice).
+    """
+    symbols, quantity, avg_price = holdings_to_arrays(portfolio)
+    existing = pd.DataFrame({'quantity': quantity, 'avg_price': avg_price}, index=pd.Index(symbols, name='symbol'))
+
+    is_buy = trades['action'].to_numpy() == 'BUY'
+    qty = trades['quantity'].to_numpy(dtype=np.float64)
+    price = trades['price'].to_numpy(dtype=np.float64)
+    trade_symbols = trades['symbol'].to_numpy()
+
+    # Running position per symbol to find close-outs and buys after a sell
+    start_qty = existing['quantity'].reindex(trade_symbols).fillna(0.0).to_numpy()
+    running = start_qty + pd.Series(np.where(is_buy, qty, -qty)).groupby(trade_symbols).cumsum().to_numpy()
+    sells_before = pd.Series((~is_buy).astype(np.int64)).groupby(trade_symbols).cumsum().to_numpy()
+    closes_out = pd.Series((running <= 1e-9) | (is_buy & (sells_before > 0))).groupby(trade_symbols).any()
+
+    grouped = pd.DataFrame({
+        'symbol': trade_symbols,
+        'buy_qty': np.where(is_buy, qty, 0.0),
+        'buy_cost': np.where(is_buy, qty * price, 0.0),
+        'sell_qty': np.where(is_buy, 0.0, qty),
+        'first_date': trades['date'].dt.strftime("%Y-%m-%d")
+    }).groupby('symbol').agg({'buy_qty': 'sum', 'buy_cost': 'sum', 'sell_qty': 'sum', 'first_date': 'first'})
+
+    merged = grouped.join(existing, how='outer')
+    merged[['quantity', 'avg_price', 'buy_qty', 'buy_cost', 'sell_qty']] = merged[
+        ['quantity', 'avg_price', 'buy_qty', 'buy_cost', 'sell_qty']].fillna(0.0)
+    gross_qty = merged['quantity'] + merged['buy_qty']
+    merged['new_quantity'] = gross_qty - merged['sell_qty']
+    merged['new_avg'] = (merged['quantity'] * merged['avg_price'] + merged['buy_cost']) / gross_qty.where(gross_qty > 0)
+
+    result = {}
+    for symbol, row in merged.iterrows():
+        if closes_out.get(symbol, False) or row['new_quantity'] <= 1e-9:
+            continue
+        result[symbol] = {
+            'quantity': float(row['new_quantity']),
+            'avg_price': float(row['new_avg']),
+            'purchase_date': portfolio[symbol]['purchase_date'] if symbol in portfolio else row['first_date']
+        }
+
+    # Sequential replay for symbols the grouped averages cannot express
+    replay_symbols = set(closes_out[closes_out].index)
+    if replay_symbols:
+        replay = {symbol: dict(portfolio[symbol]) for symbol in replay_symbols if symbol in portfolio}
+        subset = trades[trades['symbol'].isin(replay_symbols)]
+        for transaction in trades_to_transactions(subset):
+            apply_transaction(replay, transaction)
+        result.update(replay)
+
+    return result
+
+def trades_to_transactions(trades: pd.DataFrame) -> List[Dict]:
+    """Ledger records for normalized, priced trades"""
+    return [
+        {'date': d, 'symbol': s, 'action': a, 'quantity': q, 'price': p, 'total': q * p}
+        for d, s, a, q, p in zip(
+            trades['date'].dt.strftime("%Y-%m-%d %H:%M:%S"),
+            trades['symbol'],
+            trades['action'],
+            trades['quantity'].astype(float),
+            trades['price'].astype(float)
+        )
+    ]
+
+EXPORT_CHUNK_ROWS = 50000
+EXPORT_SPOOL_SIZE = 32 * 1024 * 1024  # spill exports larger than this to disk
+EXPORT_EXTENSIONS = {'csv': 'csv', 'json': 'json', 'jsonl': 'jsonl', 'parquet': 'parquet'}
+EXPORT_MIME_TYPES = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+def write_csv(buffer, chunks, columns: List[str]):
+    """Stream DataFrame chunks as CSV"""
+    buffer.write((','.join(columns) + '\n').encode())
+    for chunk in chunks:
+        buffer.write(chunk.to_csv(index=False, header=False).encode())
+
+def write_jsonl(buffer, chunks, columns: List[str]):
+    """Stream DataFrame chunks as JSON Lines"""
+    for chunk in chunks:
+        if not chunk.empty:
+            buffer.write(chunk.to_json(orient='records', lines=True).rstrip('\n').encode())
+            buffer.write(b'\n')
+
+def write_parquet(buffer, chunks, columns: List[str]):
+    """Stream DataFrame chunks as Parquet row groups"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(buffer, table.schema)
+        writer.write_table(table)
+    if writer is None:
+        writer = pq.ParquetWriter(buffer, pa.schema([(column, pa.string()) for column in columns]))
+    writer.close()
+
+def write_json_array(buffer, chunks):
+    """Stream DataFrame chunks as the items of one JSON array"""
+    buffer.write(b'[')
+    first = True
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        if not first:
+            buffer.write(b', ')
+        buffer.write(chunk.to_json(orient='records')[1:-1].encode())
+        first = False
+    buffer.write(b']')
+
+EXPORT_WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'parquet': write_parquet}
+
+def valuation_deltas(transactions: pd.DataFrame, closes: pd.DataFrame) -> np.ndarray:
+    """Daily change in portfolio value that trades make, given a (date x symbol) close matrix
+
+    Positions are rebuilt by scattering signed trade quantities into a
+    date x symbol grid and taking a cumulative sum; the result is the
+    row-wise sum of positions times closes. Trades dated before the first
+    row count from that row.
+    """
+    dates = closes.index
+    day_idx = np.clip(dates.searchsorted(transactions['date'].to_numpy()), 0, len(dates) - 1)
+    sym_idx = closes.columns.get_indexer(transactions['symbol'])
+
+    signed_qty = np.where(
+        transactions['action'].to_numpy() == 'SELL',
+        -transactions['quantity'].to_numpy(dtype=np.float64),
+        transactions['quantity'].to_numpy(dtype=np.float64)
+    )
+
+    deltas = np.zeros((len(dates), len(closes.columns)))
+    np.add.at(deltas, (day_idx, sym_idx), signed_qty)
+    positions = np.cumsum(deltas, axis=0)
+
+    return np.einsum('ij,ij->i', positions, closes.to_numpy(dtype=np.float64))
+
+def compute_valuation_history(transactions: pd.DataFrame, closes: pd.DataFrame) -> pd.Series:
+    """Daily portfolio value from a whole trade ledger and a (date x symbol) close matrix"""
+    values = valuation_deltas(transactions, closes)
+    return pd.Series(np.maximum(values, 0.0), index=closes.index, name='Portfolio Value')
+
+TRADING_DAYS = 252
+
+def rolling_std(returns: np.ndarray, window: int) -> np.ndarray:
+    """Rolling sample standard deviation down the rows of a (T x N) matrix
+
+    Uses windowed cumulative sums of r and r^2, so every column is done in
+    one pass; the first window-1 rows are NaN.
+    """
+    padded = np.vstack([np.zeros((1, returns.shape[1])), returns])
+    sums = np.cumsum(padded, axis=0)
+    squares = np.cumsum(padded ** 2, axis=0)
+    window_sum = sums[window:] - sums[:-window]
+    window_squares = squares[window:] - squares[:-window]
+    variance = np.maximum((window_squares - window_sum ** 2 / window) / (window - 1), 0.0)
+    result = np.full(returns.shape, np.nan)
+    result[window - 1:] = np.sqrt(variance)
+    return result
+
+def compute_risk_metrics(closes: pd.DataFrame, weights: pd.Series, benchmark: pd.Series = None,
+                         confidence: float = 0.95, window: int = 21) -> Dict:
+    """Volatility, beta, covariance/correlation and VaR for a weighted book
+
+    closes is a (trading day x symbol) close panel; weights are the value
+    weights of the same symbols. Everything is computed on the aligned
+    daily simple-returns matrix R (T x N) with matrix operations:
+    covariance = Rc'Rc / (T-1) for the demeaned Rc, portfolio returns = R w,
+    betas = Rc'bc / (T-1) / var(b).
+    """
+    symbols = [s for s in weights.index if s in closes.columns]
+    returns = closes[symbols].pct_change(fill_method=None).iloc[1:]
+    returns = returns.replace([np.inf, -np.inf], np.nan).fillna(0.0)
+    w = weights.reindex(symbols).fillna(0.0).to_numpy(dtype=np.float64)
+    w = w / w.sum() if w.sum() > 0 else w
+
+    R = returns.to_numpy(dtype=np.float64)
+    periods = len(R)
+    centered = R - R.mean(axis=0)
+    covariance = centered.T @ centered / max(periods - 1, 1)
+    stdev = np.sqrt(np.diag(covariance))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = covariance / np.outer(stdev, stdev)
+    np.fill_diagonal(correlation, 1.0)
+
+    portfolio_returns = R @ w
+    portfolio_variance = float(w @ covariance @ w)
+    portfolio_sigma = np.sqrt(portfolio_variance)
+
+    # Share of portfolio variance each holding contributes: w_i (Sigma w)_i / w'Sigma w
+    contribution = w * (covariance @ w) / portfolio_variance if portfolio_variance > 0 else np.zeros_like(w)
+
+    # One-day VaR / expected shortfall as a fraction of portfolio value
+    tail = 1 - confidence
+    var_historical = -float(np.quantile(portfolio_returns, tail)) if periods else 0.0
+    losses = portfolio_returns[portfolio_returns <= -var_historical]
+    cvar_historical = -float(losses.mean()) if len(losses) else var_historical
+    z = NormalDist().inv_cdf(tail)
+    var_parametric = -(float(portfolio_returns.mean()) + z * portfolio_sigma) if periods else 0.0
+
+    betas = pd.Series(np.nan, index=symbols)
+    portfolio_beta = None
+    if benchmark is not None and not benchmark.empty:
+        bench = benchmark.reindex(closes.index).ffill().pct_change(fill_method=None).iloc[1:].fillna(0.0).to_numpy()
+        bench_centered = bench - bench.mean()
+        bench_variance = float(bench_centered @ bench_centered) / max(periods - 1, 1)
+        if bench_variance > 0:
+            betas[:] = centered.T @ bench_centered / max(periods - 1, 1) / bench_variance
+            portfolio_beta = float(w @ betas.to_numpy())
+
+    window = min(window, max(periods, 2))
+    rolling = rolling_std(portfolio_returns[:, None], window)[:, 0] * np.sqrt(TRADING_DAYS) if periods >= window else np.array([])
+
+    return {
+        'symbols': symbols,
+        'periods': periods,
+        'portfolio_returns': pd.Series(portfolio_returns, index=returns.index, name='Return'),
+        'rolling_volatility': pd.Series(rolling, index=returns.index[:len(rolling)], name='Volatility').dropna(),
+        'volatility': portfolio_sigma * np.sqrt(TRADING_DAYS),
+        'holding_volatility': pd.Series(stdev * np.sqrt(TRADING_DAYS), index=symbols),
+        'beta': betas,
+        'portfolio_beta': portfolio_beta,
+        'risk_contribution': pd.Series(contribution, index=symbols),
+        'covariance': pd.DataFrame(covariance, index=symbols, columns=symbols),
+        'correlation': pd.DataFrame(correlation, index=symbols, columns=symbols),
+        'var_historical': var_historical,
+        'cvar_historical': cvar_historical,
+        'var_parametric': var_parametric
+    }
+
 class PortfolioTracker:
     """Main portfolio tracking class"""
-    
-    def __init__(self):
+
+    def __init__(self, provider: MarketDataProvider = None, quote_cache: QuoteCache = None,
+                 history_store: HistoryStore = None, store: 'PortfolioStore' = None,
+                 fetcher: PriceFetcher = None, profiler: RenderProfiler = None):
+        self.profiler = profiler or RenderProfiler()
+        self.store = store or get_portfolio_store(current_portfolio_id())
+        self.provider = provider or get_market_data_provider()
+        self.quote_cache = quote_cache or get_quote_cache()
+        self.history_store = history_store or get_history_store()
+        self.fetcher = fetcher or get_price_fetcher()
+
+        # Per-rerun deadlines for quote requests
+        self.symbol_timeout = float(os.environ.get('PORTFOLIO_SYMBOL_TIMEOUT', '5'))
+        self.render_deadline = time.monotonic() + float(os.environ.get('PORTFOLIO_RENDER_DEADLINE', '10'))
+        self.stale_symbols = set()
+        self.pending_history = set()  # symbols whose price history missed the render deadline
+        self.pending_risk = []  # the same for the risk metrics
+        self.refresher = None
         self.initialize_session_state()
     
     def initialize_session_state(self):
         """Initialize session state variables"""
-        if 'portfolio' not in st.session_state:
-            st.session_state.portfolio = {}
-        if 'transactions' not in st.session_state:
-            st.session_state.transactions = []
+        if any(key not in st.session_state for key in ('portfolio', 'aggregates', 'lot_book', 'ledger_id')):
+            self._load_ledger()
+        if 'portfolio_version' not in st.session_state:
+            # Bumped on every ledger write; display caches key off it
+            st.session_state.portfolio_version = 0
         if 'portfolio_history' not in st.session_state:
-            st.session_state.portfolio_history = {}
+            st.session_state.portfolio_history = pd.Series(dtype=np.float64, name='Portfolio Value')
         if 'selected_period' not in st.session_state:
             st.session_state.selected_period = '1mo'
     
+    def _load_ledger(self):
+        """(Re)build this session's holdings, aggregates and lots from the ledger"""
+        # Latest snapshot plus the log tail written after it
+        (st.session_state.portfolio,
+         st.session_state.aggregates,
+         st.session_state.lot_book,
+         st.session_state.ledger_id) = self.store.load()
+    
     def get_default_stocks(self) -> Dict[str, float]:
         """Get default stock prices (fallback if API fails)"""
         return {
@@ -97,28 +2143,67 @@ class PortfolioTracker:
             "V": 240.90,
             "WMT": 165.35
         }
-    
+    
+    def _fetch_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        """Fetch quotes from the provider within the render deadline (cache loader)"""
+        prices, timed_out = self.fetcher.fetch(
+            symbols,
+            self.provider.get_quotes,
+            symbol_timeout=self.symbol_timeout,
+            deadline=self.render_deadline,
+            on_late_result=self.quote_cache.put_many
+        )
+        self.stale_symbols.update(timed_out)
+        self.stale_symbols.update(s for s in symbols if s not in prices and s in self.fetcher.errors)
+        return prices
+
+    def _last_known_price(self, symbol: str) -> float:
+        """Best price we have when the provider did not answer"""
+        if symbol in self.fetcher.last_known:
+            return self.fetcher.last_known[symbol]
+
+        bars, _ = self.history_store.load(symbol)
+        if not bars.empty and 'Close' in bars:
+            return float(bars['Close'].iloc[-1])
+
+        # Fallback to default prices
+        return self.get_default_stocks().get(symbol, 0.0)
+
+    @profiled
+    def get_current_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """Get current prices for many symbols with one batched request"""
+        symbols = list(dict.fromkeys(s.upper().strip() for s in symbols))
+        if not symbols:
+            return {}
+
+        quotes = self.quote_cache.get_many(
+            symbols,
+            self._fetch_quotes,
+            wait_timeout=max(self.render_deadline - time.monotonic(), 0.0)
+        )
+        # Another session's in-flight load may have come back without them
+        self.stale_symbols.update(s for s in symbols if s not in quotes)
+
+        # Fall back to the last known price for anything the provider missed
+        return {
+            symbol: quotes[symbol] if symbol in quotes else self._last_known_price(symbol)
+            for symbol in symbols
+        }
+
+    @profiled
     def get_current_price(self, symbol: str) -> float:
-        """Get current stock price using yfinance"""
-        try:
-            stock = yf.Ticker(symbol)
-            hist = stock.history(period='1d')
-            if not hist.empty:
-                return float(hist['Close'].iloc[-1])
-        except:
-            pass
-        
-        # Fallback to default prices
-        default_prices = self.get_default_stocks()
-        return default_prices.get(symbol, 0.0)
+        """Get current stock price"""
+        symbol = symbol.upper().strip()
+        return self.get_current_prices([symbol]).get(symbol, 0.0)
     
+    @profiled
     def get_historical_data(self, symbol: str, period: str = '1mo') -> pd.DataFrame:
-        """Get historical stock data"""
+        """Get historical stock data, served from the local history store"""
+        symbol = symbol.upper().strip()
+        end = date.today()
         try:
-            stock = yf.Ticker(symbol)
-            hist = stock.history(period=period)
-            return hist
-        except:
+            return self.history_store.get(symbol, period_start(period, end), end, self.provider.get_history)
+        except Exception:
             return pd.DataFrame()
     
     def add_stock(self, symbol: str, quantity: float, price: float = None):
@@ -128,24 +2213,6 @@ class PortfolioTracker:
         if price is None:
             price = self.get_current_price(symbol)
         
-        if symbol in st.session_state.portfolio:
-            # Update existing holding
-            old_qty = st.session_state.portfolio[symbol]['quantity']
-            old_avg = st.session_state.portfolio[symbol]['avg_price']
-            
-            new_qty = old_qty + quantity
-            new_avg = ((old_qty * old_avg) + (quantity * price)) / new_qty
-            
-            st.session_state.portfolio[symbol]['quantity'] = new_qty
-            st.session_state.portfolio[symbol]['avg_price'] = new_avg
-        else:
-            # Add new holding
-            st.session_state.portfolio[symbol] = {
-                'quantity': quantity,
-                'avg_price': price,
-                'purchase_date': datetime.now().strftime("%Y-%m-%d")
-            }
-        
         # Record transaction
         transaction = {
             'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -155,10 +2222,10 @@ class PortfolioTracker:
             'price': price,
             'total': quantity * price
         }
-        st.session_state.transactions.append(transaction)
+        self._commit_transaction(transaction)
     
-    def remove_stock(self, symbol: str, quantity: float):
-        """Remove stock from portfolio"""
+    def remove_stock(self, symbol: str, quantity: float, method: str = 'FIFO', lot_ids: List[int] = None):
+        """Remove stock from portfolio, relieving tax lots by FIFO, LIFO or specific lots"""
         symbol = symbol.upper().strip()
         
         if symbol not in st.session_state.portfolio:
@@ -171,13 +2238,14 @@ class PortfolioTracker:
             st.error(f"Cannot remove more than current quantity ({current_qty})")
             return False
         
-        current_price = self.get_current_price(symbol)
+        if method == 'Specific lots':
+            lots = st.session_state.lot_book.open_lots(symbol)
+            selected_qty = lots.loc[lots['lot_id'].isin(lot_ids or []), 'quantity'].sum()
+            if selected_qty + TaxLots.epsilon < quantity:
+                st.error(f"Selected lots hold only {selected_qty:g} shares")
+                return False
         
-        # Update portfolio
-        if quantity == current_qty:
-            del st.session_state.portfolio[symbol]
-        else:
-            st.session_state.portfolio[symbol]['quantity'] -= quantity
+        current_price = self.get_current_price(symbol)
         
         # Record transaction
         transaction = {
@@ -186,56 +2254,139 @@ class PortfolioTracker:
             'action': 'SELL',
             'quantity': quantity,
             'price': current_price,
-            'total': quantity * current_price
+            'total': quantity * current_price,
+            'relief': format_relief(method, lot_ids)
         }
-        st.session_state.transactions.append(transaction)
+        self._commit_transaction(transaction)
         
         return True
+
+    def _commit_transaction(self, transaction: Dict):
+        """Write a transaction through to the ledger and apply it to the holdings"""
+        def apply(ids: List[int]):
+            transaction['id'] = ids[0]
+            replay_ledger(st.session_state.portfolio, st.session_state.aggregates, st.session_state.lot_book, [transaction])
+
+        self._write_through([transaction], apply)
+
+    def _write_through(self, transactions: List[Dict], apply: Callable[[List[int]], None]):
+        """Append transactions to the ledger, then apply them to the session with apply(ids)
+
+        If another session wrote to this portfolio since this one last
+        synced, the session is reloaded from the ledger instead. Snapshots
+        (holdings, aggregates and lots) are only taken of session state
+        known to match the ledger, and are stamped with the last id that
+        state includes.
+        """
+        previous_id, ids = self.store.append_many(transactions)
+        if previous_id == st.session_state.ledger_id:
+            apply(ids)
+            st.session_state.ledger_id = ids[-1]
+            self.store.snapshot_if_due(ids[-1], st.session_state.portfolio, st.session_state.aggregates,
+                                       st.session_state.lot_book)
+        else:
+            self._load_ledger()
+        st.session_state.portfolio_version += 1
+
+    @profiled
+    def import_trades(self, source, file_name: str) -> Dict:
+        """Bulk import trades from a CSV/JSON file as one ledger transaction"""
+        trades, skipped = normalize_trades(read_trades_file(source, file_name))
+
+        # Fill missing prices with one batched quote request
+        missing = trades['price'].isna() | (trades['price'] <= 0)
+        if missing.any():
+            prices = self.get_current_prices(list(trades.loc[missing, 'symbol'].unique()))
+            trades.loc[missing, 'price'] = trades.loc[missing, 'symbol'].map(prices)
+
+        priced = trades['price'] > 0
+        skipped += int((~priced).sum())
+        trades = trades[priced]
+
+        # Sells of more than is held at that point would be phantom volume and negative positions
+        trades, oversold = drop_oversells(st.session_state.portfolio, trades)
+        skipped += oversold
+
+        transactions = trades_to_transactions(trades)
+        if transactions:
+            self._commit_transactions(transactions, trades)
+
+        return {
+            'imported': len(transactions),
+            'skipped': skipped,
+            'symbols': int(trades['symbol'].nunique()),
+            'priced_from_quotes': int(missing[trades.index].sum())
+        }
+
+    def _commit_transactions(self, transactions: List[Dict], trades: pd.DataFrame):
+        """Write a batch of transactions in one go and merge the trades into the holdings"""
+        def apply(ids: List[int]):
+            for transaction, txn_id in zip(transactions, ids):
+                transaction['id'] = txn_id
+            # The lot book prices the sales; holdings merge vectorized
+            realized = np.asarray(st.session_state.lot_book.apply_many(transactions))
+            is_buy = trades['action'].to_numpy() == 'BUY'
+            sold = trades['symbol'].to_numpy()[~is_buy]
+            st.session_state.aggregates.record_batch(
+                buy_count=int(is_buy.sum()),
+                sell_count=int((~is_buy).sum()),
+                volume=float((trades['quantity'] * trades['price']).sum()),
+                realized_by_symbol=pd.Series(realized[~is_buy]).groupby(sold).sum().to_dict()
+            )
+            holdings = merge_trades(st.session_state.portfolio, trades)
+            st.session_state.lot_book.reprice(holdings, set(sold))
+            st.session_state.portfolio = holdings
+
+        self._write_through(transactions, apply)
+
+    def clear_portfolio(self):
+        """Delete all holdings and transactions of this portfolio, including its durable ledger"""
+        self.store.clear()
+        self._load_ledger()
+        st.session_state.portfolio_version += 1
+
+    def get_transactions_page(self, page: int, page_size: int) -> pd.DataFrame:
+        """One typed page of the transactions table, read from the ledger and cached per portfolio version"""
+        key = (st.session_state.portfolio_version, page, page_size)
+        cached = st.session_state.get('transactions_page')
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        frame = self.store.page_transactions((page - 1) * page_size, page_size)
+        frame['date'] = pd.to_datetime(frame['date'])
+        # Colour-coded action labels, built with one vectorized select
+        frame['action'] = np.where(frame['action'] == 'BUY', '🟢 BUY', '🔴 SELL')
+
+        st.session_state.transactions_page = (key, frame)
+        return frame
     
+    def get_pnl_by_symbol(self, holdings_df: pd.DataFrame) -> pd.DataFrame:
+        """Realized and unrealized P&L per symbol from the running aggregates"""
+        aggregates = st.session_state.aggregates
+        current_price = dict(zip(holdings_df['symbol'], holdings_df['current_price'])) if not holdings_df.empty else {}
+        symbols = sorted(set(aggregates.realized) | set(st.session_state.portfolio))
+        rows = []
+        for symbol in symbols:
+            pnl = aggregates.symbol_pnl(symbol, st.session_state.portfolio.get(symbol), current_price.get(symbol, 0.0))
+            rows.append({'symbol': symbol, **pnl, 'total': pnl['realized'] + pnl['unrealized']})
+        return pd.DataFrame(rows, columns=['symbol', 'realized', 'unrealized', 'total'])
+
+    @profiled
     def calculate_portfolio_value(self) -> Dict:
         """Calculate current portfolio value and metrics"""
-        portfolio = st.session_state.portfolio
-        
-        if not portfolio:
-            return {
-                'total_value': 0.0,
-                'total_cost': 0.0,
-                'total_gain': 0.0,
-                'gain_percentage': 0.0,
-                'holdings': []
-            }
-        
-        holdings = []
-        total_cost = 0.0
-        total_current_value = 0.0
-        
-        for symbol, data in portfolio.items():
-            current_price = self.get_current_price(symbol)
-            quantity = data['quantity']
-            avg_price = data['avg_price']
-            
-            current_value = quantity * current_price
-            cost_basis = quantity * avg_price
-            gain = current_value - cost_basis
-            gain_percentage = (gain / cost_basis * 100) if cost_basis > 0 else 0
-            
-            holdings.append({
-                'symbol': symbol,
-                'quantity': quantity,
-                'avg_price': avg_price,
-                'current_price': current_price,
-                'cost_basis': cost_basis,
-                'current_value': current_value,
-                'gain': gain,
-                'gain_percentage': gain_percentage
-            })
-            
-            total_cost += cost_basis
-            total_current_value += current_value
-        
+        symbols, quantity, avg_price = holdings_to_arrays(st.session_state.portfolio)
+
+        # Resolve every held symbol in one bulk request
+        prices = self.get_current_prices(list(symbols))
+        current_price = np.fromiter((prices.get(symbol, 0.0) for symbol in symbols), dtype=np.float64, count=len(symbols))
+
+        holdings = value_holdings(symbols, quantity, avg_price, current_price)
+
+        total_cost = float(holdings['cost_basis'].sum())
+        total_current_value = float(holdings['current_value'].sum())
         total_gain = total_current_value - total_cost
         total_gain_percentage = (total_gain / total_cost * 100) if total_cost > 0 else 0
-        
+
         return {
             'total_value': total_current_value,
             'total_cost': total_cost,
@@ -244,70 +2395,323 @@ class PortfolioTracker:
             'holdings': holdings
         }
     
-    def track_portfolio_history(self):
-        """Track portfolio value over time"""
-        portfolio_value = self.calculate_portfolio_value()
-        today = datetime.now().strftime("%Y-%m-%d")
-        
-        if today not in st.session_state.portfolio_history:
-            st.session_state.portfolio_history[today] = portfolio_value['total_value']
+    @profiled
+    def get_histories(self, symbols: List[str], start: date, end: date, pending: set = None) -> Dict[str, pd.DataFrame]:
+        """Bars for many symbols from the history store, loaded on the fetch pool within the render deadline
+
+        Symbols that miss the deadline are added to pending (pending_history
+        by default); their loads keep running and land in the store for a
+        later run. Symbols whose load fails are left out.
+        """
+        def load(chunk: List[str]) -> Dict[str, pd.DataFrame]:
+            return {symbol: self.history_store.get(symbol, start, end, self.provider.get_history) for symbol in chunk}
+
+        histories, timed_out = self.fetcher.fetch(
+            list(symbols),
+            load,
+            symbol_timeout=self.symbol_timeout,
+            deadline=self.render_deadline,
+            batch_size=1,
+            track=False
+        )
+        (self.pending_history if pending is None else pending).update(timed_out)
+        return histories
+
+    def get_close_matrix(self, symbols: List[str], start: date, end: date) -> pd.DataFrame:
+        """Daily (calendar) close matrix for symbols, forward-filled across non-trading days"""
+        dates = pd.date_range(start, end, freq='D', name='Date')
+        columns = {symbol: bars['Close'] for symbol, bars in self.get_histories(symbols, start, end).items()
+                   if not bars.empty and 'Close' in bars}
+        if columns:
+            # One aligned frame over the trading days, then forward-filled onto calendar days
+            bars = pd.concat(columns, axis=1)
+            closes = bars.reindex(bars.index.union(dates)).ffill().reindex(index=dates, columns=list(symbols))
+        else:
+            closes = pd.DataFrame(index=dates, columns=list(symbols), dtype=np.float64)
+
+        # Today is valued at the live quote; gaps before the first bar take the earliest close
+        live_prices = {s: p for s, p in self.get_current_prices(list(symbols)).items() if p > 0}
+        if live_prices:
+            closes.iloc[-1, closes.columns.get_indexer(list(live_prices))] = list(live_prices.values())
+        return closes.ffill().bfill().fillna(0.0)
+
+    @profiled
+    def get_close_panel(self, symbols: List[str], start: date, end: date, pending: set = None) -> pd.DataFrame:
+        """Trading-day close panel (date x symbol) from the history store; symbols without bars are left out
+
+        Closes are kept per session and date range, so only symbols new to
+        the range are loaded (on the fetch pool, see get_histories).
+        """
+        cache = st.session_state.setdefault('close_panel_cache', OrderedDict())
+        known = cache.setdefault((start, end), {})
+        cache.move_to_end((start, end))
+        while len(cache) > 4:
+            cache.popitem(last=False)
+
+        wanted = [symbol for symbol in dict.fromkeys(symbols) if symbol not in known]
+        for symbol, bars in self.get_histories(wanted, start, end, pending).items():
+            if not bars.empty and 'Close' in bars:
+                known[symbol] = bars['Close']
+        columns = {symbol: known[symbol] for symbol in symbols if symbol in known}
+        if not columns:
+            return pd.DataFrame()
+        panel = pd.concat(columns, axis=1).sort_index()
+        return panel.loc[pd.Timestamp(start):pd.Timestamp(end)].ffill()
+
+    @profiled
+    def get_risk_metrics(self, holdings_df: pd.DataFrame, period: str = '1y', confidence: float = 0.95,
+                         benchmark: str = None) -> Dict:
+        """Risk metrics for the current book, cached per portfolio version and date range
+
+        Symbols whose history misses the render deadline are listed in
+        pending_risk; metrics computed without them are not cached.
+        """
+        benchmark = benchmark or os.environ.get('PORTFOLIO_BENCHMARK', 'SPY')
+        end = date.today()
+        start = period_start(period, end)
+        key = (st.session_state.portfolio_version, start, end, confidence, benchmark)
+
+        self.pending_risk = []
+        cache = st.session_state.setdefault('risk_cache', OrderedDict())
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        weights = holdings_df.set_index('symbol')['current_value']
+        pending = set()
+        closes = self.get_close_panel(list(weights.index), start, end, pending)
+        bench_closes = self.get_close_panel([benchmark], start, end, pending)
+        self.pending_risk = sorted(pending)
+        if closes.empty:
+            metrics = None
+        else:
+            metrics = compute_risk_metrics(
+                closes,
+                weights,
+                bench_closes[benchmark] if benchmark in bench_closes else None,
+                confidence=confidence
+            )
+            metrics['missing'] = [s for s in weights.index if s not in closes.columns and s not in self.pending_risk]
+            metrics['benchmark'] = benchmark
+            metrics['portfolio_value'] = float(weights.sum())
+
+        if self.pending_risk:
+            return metrics
+        cache[key] = metrics
+        while len(cache) > 8:
+            cache.popitem(last=False)
+        return metrics
+
+    def _ledger_fingerprint(self) -> str:
+        """Cheap identity of the transaction ledger: its portfolio and last row id (ids are never reused)"""
+        if not st.session_state.ledger_id:
+            return ''
+        key = json.dumps([self.store.portfolio_id, st.session_state.ledger_id])
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    @profiled
+    def get_valuation_history(self) -> pd.Series:
+        """Daily portfolio value since the first trade, persisted per portfolio and updated incrementally
+
+        The stored curve is stamped with the last ledger id it includes.
+        New ledger rows add their position change times that symbol's
+        closes from the trade date on, and days since the curve was last
+        extended are valued at the positions held; only a cleared ledger or
+        a trade dated before the curve starts rebuilds it. A curve missing
+        symbols still in pending_history is shown but not stored.
+        """
+        ledger_id = st.session_state.ledger_id
+        if not ledger_id:
+            return pd.Series(dtype=np.float64, name='Portfolio Value')
+
+        data_dir = os.environ.get('PORTFOLIO_DATA_DIR', '.portfolio_data')
+        os.makedirs(data_dir, exist_ok=True)
+        data_path = os.path.join(data_dir, f"valuation_history_{self.store.portfolio_id}.{FRAME_EXT}")
+        meta_path = os.path.join(data_dir, f"valuation_history_{self.store.portfolio_id}.json")
+
+        today = date.today()
+        first_txn_id = self.store.first_transaction_id()
+        history = None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('first_txn_id') == first_txn_id and meta.get('last_txn_id', 0) <= ledger_id:
+                history = load_frame(data_path)['Portfolio Value']
+                if meta['last_txn_id'] == ledger_id and meta.get('computed_on') == today.isoformat():
+                    return history
+                history = self._update_valuation_history(history, meta['last_txn_id'], ledger_id, today)
+        except Exception:
+            history = None
+
+        if history is None:
+            transactions = pd.concat(self.store.iter_transactions(through_id=ledger_id), ignore_index=True)
+            transactions['date'] = pd.to_datetime(transactions['date']).dt.normalize()
+            symbols = list(pd.unique(transactions['symbol']))
+            closes = self.get_close_matrix(symbols, transactions['date'].min().date(), today)
+            history = compute_valuation_history(transactions, closes)
+
+        if not self.pending_history:
+            try:
+                save_frame(history.to_frame(), data_path)
+                with open(meta_path, 'w') as f:
+                    json.dump({'first_txn_id': first_txn_id, 'last_txn_id': ledger_id,
+                               'computed_on': today.isoformat()}, f)
+            except Exception:
+                pass
+        return history
+
+    def _update_valuation_history(self, history: pd.Series, last_txn_id: int, ledger_id: int,
+                                  today: date) -> pd.Series:
+        """Bring a stored curve up to ledger_id and today; None when it has to be rebuilt"""
+        def read(**kwargs) -> pd.DataFrame:
+            chunks = list(self.store.iter_transactions(through_id=ledger_id, **kwargs))
+            frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=LEDGER_EXPORT_COLUMNS)
+            frame['date'] = pd.to_datetime(frame['date']).dt.normalize()
+            return frame
+
+        tail = read(after_id=last_txn_id)
+        if len(tail) and tail['date'].min() < history.index[0]:
+            return None
+
+        # The last stored day may have been valued intraday; revalue it along with the days since
+        last_day = history.index[-1]
+        extend = last_day < pd.Timestamp(today)
+        history = history.reindex(pd.date_range(history.index[0], today, freq='D', name='Date'))
+        if extend:
+            # Positions at the start of last_day, then the trades dated from it on as deltas
+            recent = read(since=last_day.strftime("%Y-%m-%d"))
+            signed_qty = np.where(recent['action'] == 'SELL', -1.0, 1.0) * recent['quantity'].to_numpy(dtype=np.float64)
+            held = {symbol: holding['quantity'] for symbol, holding in st.session_state.portfolio.items()}
+            positions = pd.Series(held, dtype=np.float64).sub(
+                pd.Series(signed_qty).groupby(recent['symbol'].to_numpy()).sum(), fill_value=0.0)
+            positions = positions[positions.abs() > TaxLots.epsilon]
+            tail = tail[tail['date'] < last_day]
+        else:
+            recent, positions = tail.iloc[:0], pd.Series(dtype=np.float64)
+
+        starts = ([last_day] if extend else []) + ([tail['date'].min()] if len(tail) else [])
+        if not starts:
+            return history
+        symbols = list(dict.fromkeys(list(positions.index) + list(recent['symbol']) + list(tail['symbol'])))
+        closes = self.get_close_matrix(symbols, min(starts).date(), today)
+
+        if extend:
+            days = closes.index[closes.index >= last_day]
+            history.loc[days] = (closes.loc[days, positions.index].to_numpy() @ positions.to_numpy()
+                                 + valuation_deltas(recent, closes.loc[days]))
+        if len(tail):
+            # With the curve extended, days from last_day on already include these trades
+            days = closes.index[closes.index < last_day] if extend else closes.index
+            history.loc[days] += valuation_deltas(tail, closes.loc[days])
+        return history.clip(lower=0.0).rename('Portfolio Value')
+
+    def track_portfolio_history(self, live_value: float = None):
+        """Refresh the daily valuation curve when the ledger changes
+
+        Past days are cached for the day; today's point is set from
+        live_value (the current valuation) on every run. A curve built
+        while some price history was still loading is rebuilt next run.
+        """
+        history_key = (self._ledger_fingerprint(), date.today().isoformat())
+        if st.session_state.get('portfolio_history_key') != history_key:
+            self.pending_history.clear()
+            st.session_state.valuation_history = self.get_valuation_history()
+            st.session_state.portfolio_history_key = history_key if not self.pending_history else None
+
+        history = st.session_state.valuation_history
+        if live_value is not None and len(history) and history.index[-1] == pd.Timestamp(date.today()):
+            history = history.copy()
+            history.iloc[-1] = live_value
+        st.session_state.portfolio_history = history
     
-    def get_portfolio_history_chart(self, period_days: int = 30):
-        """Generate portfolio history chart"""
-        if len(st.session_state.portfolio_history) < 2:
+    def get_portfolio_history_chart(self, period_days: int = None):
+        """Generate portfolio history chart data (period_days=None for all history)"""
+        history = st.session_state.portfolio_history
+        if len(history) < 2:
             return None
-        
-        # Simulate historical data for demonstration
-        # In production, you'd store actual daily values
-        dates = pd.date_range(end=datetime.now(), periods=period_days, freq='D')
-        values = []
-        
-        current_value = self.calculate_portfolio_value()['total_value']
-        
-        # Generate realistic looking historical data
-        for i in range(period_days):
-            # Simulate some random variation
-            variation = np.random.normal(0, 0.02)  # 2% daily variation
-            value = current_value * (1 + variation * (period_days - i) / period_days)
-            values.append(max(value, 0))
-        
-        # Reverse to get increasing timeline
-        values = values[::-1]
-        
+
+        if period_days is not None:
+            history = history[history.index > history.index[-1] - pd.Timedelta(days=period_days)]
+
         return pd.DataFrame({
-            'Date': dates,
-            'Portfolio Value': values
+            'Date': history.index,
+            'Portfolio Value': history.to_numpy()
         })
     
-    def export_portfolio(self, format_type: str = 'csv'):
-        """Export portfolio data"""
+    @profiled
+    def export_portfolio(self, format_type: str = 'csv', dataset: str = 'holdings') -> Tuple[tempfile.SpooledTemporaryFile, str, str]:
+        """Export portfolio data into an in-memory (spooled) buffer
+
+        CSV, JSON Lines and Parquet exports contain either the holdings or
+        the transactions; JSON contains the summary, holdings and
+        transactions together. Rows are written in chunks, so a large ledger
+        never has to be materialized. Returns (buffer, file name, MIME type).
+        """
         portfolio_data = self.calculate_portfolio_value()
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        if format_type == 'csv':
-            # Export holdings to CSV
-            holdings_df = pd.DataFrame(portfolio_data['holdings'])
-            filename = f"portfolio_export_{timestamp}.csv"
-            holdings_df.to_csv(filename, index=False)
-            return filename
-        else:
-            # Export to JSON
-            export_data = {
-                'export_date': timestamp,
-                'portfolio_summary': {
-                    'total_value': portfolio_data['total_value'],
-                    'total_cost': portfolio_data['total_cost'],
-                    'total_gain': portfolio_data['total_gain'],
-                    'gain_percentage': portfolio_data['gain_percentage']
-                },
-                'holdings': portfolio_data['holdings'],
-                'transactions': st.session_state.transactions
+        buffer = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE, mode='w+b')
+
+        def holdings_chunks():
+            holdings = portfolio_data['holdings']
+            for i in range(0, len(holdings), EXPORT_CHUNK_ROWS):
+                yield holdings.iloc[i:i + EXPORT_CHUNK_ROWS]
+
+        def transaction_chunks():
+            return self.store.iter_transactions(EXPORT_CHUNK_ROWS)
+
+        if format_type == 'json':
+            summary = {
+                'total_value': portfolio_data['total_value'],
+                'total_cost': portfolio_data['total_cost'],
+                'total_gain': portfolio_data['total_gain'],
+                'gain_percentage': portfolio_data['gain_percentage']
             }
+            buffer.write(f'{{"export_date": "{timestamp}", "portfolio_summary": {json.dumps(summary)}, '.encode())
+            buffer.write(b'"holdings": ')
+            write_json_array(buffer, holdings_chunks())
+            buffer.write(b', "transactions": ')
+            write_json_array(buffer, transaction_chunks())
+            buffer.write(b'}')
             filename = f"portfolio_export_{timestamp}.json"
-            with open(filename, 'w') as f:
-                json.dump(export_data, f, indent=2)
-            return filename
+        else:
+            chunks = holdings_chunks() if dataset == 'holdings' else transaction_chunks()
+            columns = HOLDINGS_COLUMNS if dataset == 'holdings' else LEDGER_EXPORT_COLUMNS
+            EXPORT_WRITERS[format_type](buffer, chunks, columns)
+            filename = f"portfolio_{dataset}_{timestamp}.{EXPORT_EXTENSIONS[format_type]}"
+
+        buffer.seek(0)
+        return buffer, filename, EXPORT_MIME_TYPES[format_type]
     
+    def reset_render_deadline(self):
+        """Start a fresh quote deadline (each fragment rerun is its own render)"""
+        self.render_deadline = time.monotonic() + float(os.environ.get('PORTFOLIO_RENDER_DEADLINE', '10'))
+
+    def start_live_prices(self):
+        """Register this session's symbols with the background price poller"""
+        if 'session_id' not in st.session_state:
+            st.session_state.session_id = os.urandom(8).hex()
+        self.refresher = get_price_refresher()
+        self.refresher.watch(st.session_state.session_id, list(st.session_state.portfolio))
+
+    def _live_key(self) -> Tuple:
+        """Inputs of the live valuation: the ledger and the latest change among our prices"""
+        price_version = self.refresher.version_for(st.session_state.portfolio) if self.refresher else None
+        return (st.session_state.portfolio_version, price_version)
+
+    def remember_live_value(self, portfolio_data: Dict):
+        """Seed the live valuation with the one computed by the full run"""
+        st.session_state.live_valuation = (self._live_key(), portfolio_data)
+
+    def get_live_portfolio_value(self) -> Dict:
+        """Portfolio valuation, recomputed only when the ledger or one of its prices changed"""
+        key = self._live_key()
+        cached = st.session_state.get('live_valuation')
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        portfolio_data = self.calculate_portfolio_value()
+        st.session_state.live_valuation = (key, portfolio_data)
+        return portfolio_data
+
     def display_portfolio_metrics(self, portfolio_data: Dict):
         """Display portfolio metrics in Streamlit"""
         col1, col2, col3, col4 = st.columns(4)
@@ -343,6 +2747,7 @@ class PortfolioTracker:
         """Render sidebar controls"""
         with st.sidebar:
             st.markdown("## 📊 Portfolio Controls")
+            st.caption(f"Portfolio `{self.store.portfolio_id}` · bookmark this page to come back to it")
             
             # Add Stock Form
             st.markdown("### Add Stock")
@@ -359,6 +2764,26 @@ class PortfolioTracker:
             
             st.divider()
             
+            # Bulk Import
+            st.markdown("### Import Trades")
+            uploaded = st.file_uploader(
+                "CSV / JSON / JSON Lines",
+                type=["csv", "json", "jsonl"],
+                help="Columns: symbol, quantity, and optionally price, action (BUY/SELL) and date"
+            )
+            if uploaded is not None and st.button("Import Trades", width='stretch'):
+                try:
+                    summary = self.import_trades(uploaded, uploaded.name)
+                except Exception as e:
+                    st.error(f"Import failed: {str(e)}")
+                else:
+                    st.success(
+                        f"Imported {summary['imported']} trades across {summary['symbols']} symbols"
+                        + (f" ({summary['skipped']} rows skipped)" if summary['skipped'] else "")
+                    )
+
+            st.divider()
+
             # Remove Stock Form
             st.markdown("### Remove Stock")
             if st.session_state.portfolio:
@@ -372,9 +2797,19 @@ class PortfolioTracker:
                     step=0.1,
                     key="remove_qty"
                 )
+                lot_method = st.selectbox("Lot Relief", LOT_METHODS, key="lot_method",
+                                          help="Which tax lots the sale is taken from")
+                lot_ids = None
+                if lot_method == 'Specific lots':
+                    open_lots = st.session_state.lot_book.open_lots(selected_symbol)
+                    lot_labels = {
+                        int(lot.lot_id): f"#{lot.lot_id} · {pd.Timestamp(lot.acquired):%Y-%m-%d} · {lot.quantity:g} @ ${lot.price:,.2f}"
+                        for lot in open_lots.itertuples()
+                    }
+                    lot_ids = st.multiselect("Lots", list(lot_labels), format_func=lot_labels.get, key="lot_ids")
                 
                 if st.button("Remove from Portfolio", width='stretch'):
-                    if self.remove_stock(selected_symbol, selected_qty):
+                    if self.remove_stock(selected_symbol, selected_qty, lot_method, lot_ids):
                         st.success(f"Removed {selected_qty} shares of {selected_symbol}")
                         st.rerun()
             else:
@@ -384,27 +2819,81 @@ class PortfolioTracker:
             
             # Export Options
             st.markdown("### Export Data")
-            export_format = st.selectbox("Format", ["CSV", "JSON"])
+            export_format = st.selectbox("Format", ["CSV", "JSON", "JSON Lines", "Parquet"])
+            export_dataset = st.radio(
+                "Data",
+                ["Holdings", "Transactions"],
+                horizontal=True,
+                disabled=export_format == "JSON",
+                help="JSON exports always include the summary, holdings and transactions"
+            )
             if st.button("Export Portfolio", width='stretch'):
-                filename = self.export_portfolio(export_format.lower())
-                st.success(f"Exported to {filename}")
-                
-                with open(filename, "rb") as file:
-                    st.download_button(
-                        label="Download File",
-                        data=file,
-                        file_name=filename,
-                        mime="text/csv" if export_format == "CSV" else "application/json"
-                    )
+                format_type = {"CSV": "csv", "JSON": "json", "JSON Lines": "jsonl", "Parquet": "parquet"}[export_format]
+                try:
+                    buffer, filename, mime = self.export_portfolio(format_type, export_dataset.lower())
+                except ImportError:
+                    st.error("Parquet export needs pyarrow: pip install pyarrow")
+                else:
+                    with buffer:
+                        st.download_button(
+                            label="Download File",
+                            data=buffer.read(),
+                            file_name=filename,
+                            mime=mime
+                        )
             
             st.divider()
             
             # Clear Portfolio
             if st.button("Clear Portfolio", type="secondary", width='stretch'):
-                st.session_state.portfolio = {}
-                st.session_state.transactions = []
+                self.clear_portfolio()
                 st.rerun()
-            
+
+            # Quote cache and fetch statistics
+            with st.expander("⚡ Market Data"):
+                stats = self.quote_cache.get_stats()
+                lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+                hit_rate = (stats['hits'] + stats['stale_hits']) / lookups * 100 if lookups else 0
+                figure_stats = get_figure_cache().stats
+                st.caption(f"TTL {self.quote_cache.ttl:.0f}s · {stats['size']}/{self.quote_cache.max_size} symbols")
+                if self.provider.name == 'replay' and self.provider.clock is not None:
+                    st.caption(f"Replaying {len(self.provider.symbols)} symbols · clock {self.provider.clock:%Y-%m-%d}")
+                st.markdown(f"""
+                - Hit rate: **{hit_rate:.1f}%**
+                - Fresh hits: {stats['hits']} · Stale hits: {stats['stale_hits']}
+                - Misses: {stats['misses']} · Background refreshes: {stats['refreshes']}
+                - Evictions: {stats['evictions']}
+                - Shared with other sessions: {stats['shared_loads']} · In flight: {stats['in_flight']}
+                - Charts reused: {figure_stats['hits']} · Charts built: {figure_stats['misses']}
+                """)
+
+                if self.fetcher.latencies:
+                    latency_df = pd.DataFrame({
+                        'Symbol': list(self.fetcher.latencies.keys()),
+                        'Latency (s)': list(self.fetcher.latencies.values())
+                    }).nlargest(10, 'Latency (s)')
+                    st.caption("Slowest quote requests")
+                    st.dataframe(latency_df, hide_index=True, width='stretch')
+                if self.fetcher.errors:
+                    st.caption("Recent quote errors")
+                    for symbol, error in list(self.fetcher.errors.items())[:10]:
+                        st.markdown(f"- **{symbol}**: {error}")
+
+            st.toggle(
+                "🔴 Live prices",
+                key="live_prices",
+                help="Poll quotes in the background and refresh the summary cards without a full rerun"
+            )
+            if self.refresher is not None:
+                status = self.refresher.get_status()
+                last_refresh = f"{status['last_refresh']:%H:%M:%S}" if status['last_refresh'] else "pending"
+                st.caption(
+                    f"Every {self.refresher.interval:.0f}s · {status['symbols']} symbols for {status['sessions']} "
+                    f"session(s) · last poll {last_refresh} ({status['last_duration'] * 1000:.0f} ms)"
+                )
+
+            st.toggle("⏱️ Profile rendering", key="profile_render", help="Time each phase of the next rerun")
+
             # Display Info
             st.markdown("---")
             st.markdown("**💡 Tips:**")
@@ -415,30 +2904,271 @@ class PortfolioTracker:
             - Export data for analysis
             """)
 
+CHART_MAX_POINTS = int(os.environ.get('PORTFOLIO_CHART_MAX_POINTS', '1000'))
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices kept by Largest-Triangle-Three-Buckets downsampling
+
+    Keeps the first and last points and, from each of n_out-2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket, which
+    preserves the visual shape (peaks and troughs) of the line.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (n_out - 2)
+    bounds = np.append((np.arange(n_out - 1) * every).astype(np.int64) + 1, n)
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    anchor = 0
+    for i in range(n_out - 2):
+        start, stop = bounds[i], bounds[i + 1]
+        next_start, next_stop = bounds[i + 1], bounds[i + 2]
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        area = np.abs(
+            (x[anchor] - avg_x) * (y[start:stop] - y[anchor])
+            - (x[anchor] - x[start:stop]) * (avg_y - y[anchor])
+        )
+        anchor = start + int(area.argmax())
+        kept[i + 1] = anchor
+    return kept
+
+def data_fingerprint(*parts) -> str:
+    """Stable hash of chart inputs (pandas objects, arrays and plain values)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, (pd.Series, pd.DataFrame, pd.Index)):
+            if isinstance(part, pd.DataFrame):
+                digest.update(repr(list(part.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=not isinstance(part, pd.Index)).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            digest.update(str(part.dtype).encode() + str(part.shape).encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+class FigureCache:
+    """LRU cache of built Plotly figures keyed on a fingerprint of their inputs
+
+    Figures are only read after construction (st.plotly_chart serializes a
+    copy), so identical inputs from any session reuse the same object.
+    """
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get_or_build(self, kind: str, fingerprint: str, builder: Callable[[], go.Figure]) -> go.Figure:
+        key = (kind, fingerprint)
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is not None:
+                self._figures.move_to_end(key)
+                self.stats['hits'] += 1
+                return figure
+            self.stats['misses'] += 1
+
+        figure = builder()
+        with self._lock:
+            self._figures[key] = figure
+            while len(self._figures) > self.max_size:
+                self._figures.popitem(last=False)
+        return figure
+
+@st.cache_resource
+def get_figure_cache() -> FigureCache:
+    """Process-wide figure cache"""
+    return FigureCache(max_size=int(os.environ.get('PORTFOLIO_FIGURE_CACHE_SIZE', '64')))
+
+def build_history_figure(history_data: pd.DataFrame, period: str) -> go.Figure:
+    """Portfolio value line, LTTB-downsampled to CHART_MAX_POINTS"""
+    dates = history_data['Date'].to_numpy()
+    values = history_data['Portfolio Value'].to_numpy(dtype=np.float64)
+    kept = lttb_indices(dates.astype('datetime64[ns]').astype(np.int64), values, CHART_MAX_POINTS)
+
+    fig = go.Figure()
+    
+    # Add portfolio value line
+    fig.add_trace(go.Scatter(
+        x=dates[kept],
+        y=values[kept],
+        mode='lines',
+        name='Portfolio Value',
+        line=dict(color='#1E3A8A', width=3),
+        fill='tozeroy',
+        fillcolor='rgba(30, 58, 138, 0.1)'
+    ))
+    
+    # Update layout
+    fig.update_layout(
+        title=f"Portfolio Value Over Time ({period})",
+        xaxis_title="Date",
+        yaxis_title="Portfolio Value ($)",
+        hovermode='x unified',
+        template='plotly_white',
+        height=400
+    )
+    return fig
+
+def build_allocation_figure(symbols: pd.Series, values: pd.Series) -> go.Figure:
+    """Allocation donut"""
+    fig = go.Figure(data=[go.Pie(
+        labels=symbols,
+        values=values,
+        hole=.3,
+        textinfo='label+percent',
+        marker=dict(colors=px.colors.qualitative.Set3)
+    )])
+    
+    fig.update_layout(
+        title="Portfolio Allocation by Stock",
+        height=400
+    )
+    return fig
+
+def build_gain_figure(symbols: pd.Series, gain_percentage: pd.Series) -> go.Figure:
+    """Gain/loss % bars"""
+    fig = go.Figure()
+    
+    # Add bars for gain/loss
+    colors = np.where(gain_percentage >= 0, '#10B981', '#EF4444')
+    
+    fig.add_trace(go.Bar(
+        x=symbols,
+        y=gain_percentage,
+        name='Gain %',
+        marker_color=colors,
+        texttemplate='%{y:.1f}%',
+        textposition='auto'
+    ))
+    
+    fig.update_layout(
+        title="Gain/Loss Percentage by Stock",
+        xaxis_title="Stock Symbol",
+        yaxis_title="Gain/Loss (%)",
+        height=400
+    )
+    return fig
+
+def build_rolling_volatility_figure(rolling: pd.Series) -> go.Figure:
+    """Rolling annualized volatility line, LTTB-downsampled"""
+    kept = lttb_indices(rolling.index.to_numpy().astype('datetime64[ns]').astype(np.int64), rolling.to_numpy(), CHART_MAX_POINTS)
+    fig = go.Figure(go.Scatter(
+        x=rolling.index[kept],
+        y=rolling.to_numpy()[kept] * 100,
+        mode='lines',
+        name='21-day volatility',
+        line=dict(color='#1E3A8A', width=2)
+    ))
+    fig.update_layout(
+        title="Rolling 21-Day Volatility (annualized)",
+        xaxis_title="Date",
+        yaxis_title="Volatility (%)",
+        hovermode='x unified',
+        template='plotly_white',
+        height=350
+    )
+    return fig
+
+def build_correlation_figure(correlation: pd.DataFrame) -> go.Figure:
+    """Correlation heatmap"""
+    fig = px.imshow(
+        correlation.to_numpy(),
+        x=list(correlation.columns),
+        y=list(correlation.index),
+        color_continuous_scale='RdBu_r',
+        zmin=-1,
+        zmax=1,
+        aspect='auto'
+    )
+    fig.update_layout(title="Correlation of Daily Returns", height=600)
+    return fig
+
+def render_live_metrics(tracker: PortfolioTracker):
+    """Summary cards; as a fragment with run_every they follow the live price poller"""
+    tracker.reset_render_deadline()
+    if tracker.refresher is not None:
+        tracker.start_live_prices()  # keep this session's symbols watched
+    tracker.display_portfolio_metrics(tracker.get_live_portfolio_value())
+    if tracker.refresher is not None and tracker.refresher.last_refresh is not None:
+        st.caption(f"🔴 Live · prices as of {tracker.refresher.last_refresh:%H:%M:%S}")
+
+def render_allocation_chart(tracker: PortfolioTracker):
+    """Allocation donut, redrawn from the live valuation"""
+    holdings_df = tracker.get_live_portfolio_value()['holdings']
+    if not holdings_df.empty:
+        st.markdown("<h2 class='section-header'>Portfolio Allocation</h2>", unsafe_allow_html=True)
+        fig = get_figure_cache().get_or_build(
+            'allocation',
+            data_fingerprint(holdings_df['symbol'], holdings_df['current_value']),
+            lambda: build_allocation_figure(holdings_df['symbol'], holdings_df['current_value'])
+        )
+        st.plotly_chart(fig, width='stretch')
+
 def main():
     """Main Streamlit application"""
+    # Opt-in render profiling (sidebar toggle or PORTFOLIO_PROFILE=1)
+    profiler = RenderProfiler(
+        enabled=st.session_state.get('profile_render', False) or os.environ.get('PORTFOLIO_PROFILE') == '1'
+    )
+
     # Initialize tracker
-    tracker = PortfolioTracker()
+    with profiler.phase("init"):
+        tracker = PortfolioTracker(profiler=profiler)
+        live = st.session_state.get('live_prices', False)
+        if live:
+            tracker.start_live_prices()
     
     # Header
     st.markdown("<h1 class='main-header'>📈 Advanced Stock Portfolio Tracker</h1>", unsafe_allow_html=True)
     
     # Sidebar
-    tracker.render_sidebar()
+    with profiler.phase("sidebar"):
+        tracker.render_sidebar()
     
     # Main content area
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Portfolio Overview", "📈 Performance", "📋 Holdings", "🔄 Transactions"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(
+        ["📊 Portfolio Overview", "📈 Performance", "📋 Holdings", "🔄 Transactions", "⚠️ Risk"]
+    )
     
-    # Track history
-    tracker.track_portfolio_history()
+    # Calculate portfolio data once; every tab shares the same holdings frame
+    with profiler.phase("valuation"):
+        portfolio_data = tracker.calculate_portfolio_value()
+        holdings_df = portfolio_data['holdings']
+        tracker.remember_live_value(portfolio_data)
     
-    # Calculate portfolio data
-    portfolio_data = tracker.calculate_portfolio_value()
+    # Track history; today's point is the valuation above
+    with profiler.phase("history"):
+        tracker.track_portfolio_history(portfolio_data['total_value'])
     
-    with tab1:
+    # With live prices on, the summary cards and allocation chart rerun on their own
+    live_every = tracker.refresher.interval if live else None
+    
+    with tab1, profiler.phase("overview tab"):
+        if tracker.stale_symbols:
+            st.warning(
+                "⏱️ Live prices unavailable for " + ", ".join(sorted(tracker.stale_symbols)) +
+                " — showing the last known price instead."
+            )
+        if tracker.pending_history:
+            st.caption(
+                f"⏳ Price history pending for {len(tracker.pending_history)} symbols — "
+                "the performance chart values them at today's price until it arrives."
+            )
+
         # Portfolio Metrics
         st.markdown("<h2 class='section-header'>Portfolio Summary</h2>", unsafe_allow_html=True)
-        tracker.display_portfolio_metrics(portfolio_data)
+        st.fragment(run_every=live_every)(render_live_metrics)(tracker)
         
         # Performance Chart
         st.markdown("<h2 class='section-header'>Portfolio Performance</h2>", unsafe_allow_html=True)
@@ -461,153 +3191,88 @@ def main():
                 "3M": 90,
                 "6M": 180,
                 "1Y": 365,
-                "All": 365
+                "All": None
             }[period]
         )
         
         if history_data is not None:
-            fig = go.Figure()
-            
-            # Add portfolio value line
-            fig.add_trace(go.Scatter(
-                x=history_data['Date'],
-                y=history_data['Portfolio Value'],
-                mode='lines',
-                name='Portfolio Value',
-                line=dict(color='#1E3A8A', width=3),
-                fill='tozeroy',
-                fillcolor='rgba(30, 58, 138, 0.1)'
-            ))
-            
-            # Update layout
-            fig.update_layout(
-                title=f"Portfolio Value Over Time ({period})",
-                xaxis_title="Date",
-                yaxis_title="Portfolio Value ($)",
-                hovermode='x unified',
-                template='plotly_white',
-                height=400
+            # Rebuilt only when the curve or the period changes
+            fig = get_figure_cache().get_or_build(
+                'history',
+                data_fingerprint(history_data, period, CHART_MAX_POINTS),
+                lambda: build_history_figure(history_data, period)
             )
             
-            st.plotly_chart(fig,width='stretch')
+            st.plotly_chart(fig, width='stretch')
         else:
             st.info("Add stocks to your portfolio to see performance charts.")
         
         # Allocation Pie Chart
-        if portfolio_data['holdings']:
-            st.markdown("<h2 class='section-header'>Portfolio Allocation</h2>", unsafe_allow_html=True)
-            
-            holdings_df = pd.DataFrame(portfolio_data['holdings'])
-            fig = go.Figure(data=[go.Pie(
-                labels=holdings_df['symbol'],
-                values=holdings_df['current_value'],
-                hole=.3,
-                textinfo='label+percent',
-                marker=dict(colors=px.colors.qualitative.Set3)
-            )])
-            
-            fig.update_layout(
-                title="Portfolio Allocation by Stock",
-                height=400
-            )
-            
-            st.plotly_chart(fig, width='stretch')
+        st.fragment(run_every=live_every)(render_allocation_chart)(tracker)
     
-    with tab2:
+    with tab2, profiler.phase("performance tab"):
         st.markdown("<h2 class='section-header'>Detailed Performance Analysis</h2>", unsafe_allow_html=True)
         
-        if portfolio_data['holdings']:
-            # Create performance comparison
-            perf_df = pd.DataFrame(portfolio_data['holdings'])
-            
-            # Sort by current value
-            perf_df = perf_df.sort_values('current_value', ascending=False)
-            
-            # Display performance metrics for each stock
-            for _, row in perf_df.iterrows():
-                col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 1, 2])
-                
-                with col1:
-                    st.markdown(f"**{row['symbol']}**")
-                
-                with col2:
-                    st.markdown(f"**Qty:** {row['quantity']:.2f}")
-                
-                with col3:
-                    st.markdown(f"**Price:** ${row['current_price']:.2f}")
-                
-                with col4:
-                    st.markdown(f"**Value:** ${row['current_value']:.2f}")
-                
-                with col5:
-                    gain_class = "positive" if row['gain'] >= 0 else "negative"
-                    st.markdown(f"<span class='{gain_class}'>Gain: ${row['gain']:.2f} ({row['gain_percentage']:.2f}%)</span>", unsafe_allow_html=True)
-                
-                # Mini progress bar for allocation
-                allocation = (row['current_value'] / portfolio_data['total_value']) * 100
-                st.progress(allocation / 100, text=f"Allocation: {allocation:.1f}%")
+        if not holdings_df.empty:
+            # Sort by current value and compute allocation for every holding in one pass
+            perf_df = holdings_df.sort_values('current_value', ascending=False, ignore_index=True)
+            total_value = portfolio_data['total_value']
+            perf_df['allocation'] = perf_df['current_value'] / total_value * 100 if total_value > 0 else 0.0
+            perf_df['symbol'] = perf_df['symbol'] + np.where(perf_df['symbol'].isin(tracker.stale_symbols), " ⏱️", "")
+
+            # Only the visible page is sent to the browser
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key="perf_page_size")
+            page_count = max(1, -(-len(perf_df) // page_size))
+            with col2:
+                page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1, key="perf_page")
+            with col3:
+                st.caption(f"{len(perf_df)} holdings · page {page} of {page_count}")
+
+            page_df = perf_df.iloc[(page - 1) * page_size:page * page_size]
+
+            st.dataframe(
+                page_df[['symbol', 'quantity', 'current_price', 'current_value', 'gain', 'gain_percentage', 'allocation']],
+                width='stretch',
+                hide_index=True,
+                column_config={
+                    'symbol': st.column_config.TextColumn("Symbol"),
+                    'quantity': st.column_config.NumberColumn("Qty", format="%.2f"),
+                    'current_price': st.column_config.NumberColumn("Price", format="$%.2f"),
+                    'current_value': st.column_config.NumberColumn("Value", format="$%.2f"),
+                    'gain': st.column_config.NumberColumn("Gain", format="$%.2f"),
+                    'gain_percentage': st.column_config.NumberColumn("Gain %", format="%.2f%%"),
+                    'allocation': st.column_config.ProgressColumn(
+                        "Allocation", format="%.1f%%", min_value=0.0, max_value=100.0
+                    )
+                }
+            )
             
             # Performance Comparison Chart
             st.markdown("<h3 class='section-header'>Performance Comparison</h3>", unsafe_allow_html=True)
             
-            fig = go.Figure()
-            
-            # Add bars for gain/loss
-            colors = ['#10B981' if x >= 0 else '#EF4444' for x in perf_df['gain_percentage']]
-            
-            fig.add_trace(go.Bar(
-                x=perf_df['symbol'],
-                y=perf_df['gain_percentage'],
-                name='Gain %',
-                marker_color=colors,
-                text=perf_df['gain_percentage'].apply(lambda x: f'{x:.1f}%'),
-                textposition='auto'
-            ))
-            
-            fig.update_layout(
-                title="Gain/Loss Percentage by Stock",
-                xaxis_title="Stock Symbol",
-                yaxis_title="Gain/Loss (%)",
-                height=400
+            # Visible page only
+            fig = get_figure_cache().get_or_build(
+                'gain',
+                data_fingerprint(page_df['symbol'], page_df['gain_percentage']),
+                lambda: build_gain_figure(page_df['symbol'], page_df['gain_percentage'])
             )
             
             st.plotly_chart(fig, width='stretch')
         else:
             st.info("No stocks in portfolio. Add some stocks to see performance analysis.")
     
-    with tab3:
+    with tab3, profiler.phase("holdings tab"):
         st.markdown("<h2 class='section-header'>Current Holdings</h2>", unsafe_allow_html=True)
         
-        if portfolio_data['holdings']:
-            # Display holdings in a nice format
-            holdings_df = pd.DataFrame(portfolio_data['holdings'])
-            
-            # Format the DataFrame for display
-            display_df = holdings_df.copy()
-            display_df['avg_price'] = display_df['avg_price'].apply(lambda x: f"${x:.2f}")
-            display_df['current_price'] = display_df['current_price'].apply(lambda x: f"${x:.2f}")
-            display_df['cost_basis'] = display_df['cost_basis'].apply(lambda x: f"${x:,.2f}")
-            display_df['current_value'] = display_df['current_value'].apply(lambda x: f"${x:,.2f}")
-            display_df['gain'] = display_df['gain'].apply(lambda x: f"${x:,.2f}")
-            display_df['gain_percentage'] = display_df['gain_percentage'].apply(lambda x: f"{x:.2f}%")
-            
-            # Rename columns for better display
-            display_df = display_df.rename(columns={
-                'symbol': 'Symbol',
-                'quantity': 'Quantity',
-                'avg_price': 'Avg Price',
-                'current_price': 'Current Price',
-                'cost_basis': 'Cost Basis',
-                'current_value': 'Current Value',
-                'gain': 'Gain/Loss',
-                'gain_percentage': 'Gain %'
-            })
-            
-            # Display as table
+        if not holdings_df.empty:
+            # Numbers stay numeric; formatting happens in the browser
             st.dataframe(
-                display_df,
+                holdings_df,
                 width='stretch',
-                hide_index=True
+                hide_index=True,
+                column_config=HOLDINGS_COLUMN_CONFIG
             )
             
             # Summary statistics
@@ -621,49 +3286,180 @@ def main():
             with col3:
                 best_performer = holdings_df.loc[holdings_df['gain_percentage'].idxmax()]
                 st.metric("Best Performer", f"{best_performer['symbol']} ({best_performer['gain_percentage']:.2f}%)")
+            
+            # Tax lots
+            st.markdown("<h3 class='section-header'>Tax Lots</h3>", unsafe_allow_html=True)
+            lot_book = st.session_state.lot_book
+            lot_summary = lot_book.summary(dict(zip(holdings_df['symbol'], holdings_df['current_price'])))
+            st.dataframe(
+                lot_summary,
+                width='stretch',
+                hide_index=True,
+                column_config={
+                    'symbol': st.column_config.TextColumn("Symbol"),
+                    'open_lots': st.column_config.NumberColumn("Open Lots", format="%d"),
+                    'open_quantity': st.column_config.NumberColumn("Shares", format="%.4f"),
+                    'realized': st.column_config.NumberColumn("Realized P&L", format="$%.2f"),
+                    'unrealized': st.column_config.NumberColumn("Unrealized P&L", format="$%.2f")
+                }
+            )
+            lot_symbol = st.selectbox("Show lots for", list(holdings_df['symbol']), key="lot_symbol")
+            st.dataframe(
+                lot_book.open_lots(lot_symbol),
+                width='stretch',
+                hide_index=True,
+                column_config={
+                    'lot_id': st.column_config.NumberColumn("Lot", format="%d"),
+                    'acquired': st.column_config.DatetimeColumn("Acquired", format="YYYY-MM-DD HH:mm"),
+                    'quantity': st.column_config.NumberColumn("Shares", format="%.4f"),
+                    'price': st.column_config.NumberColumn("Cost / Share", format="$%.2f")
+                }
+            )
         else:
             st.info("No holdings in portfolio. Use the sidebar to add stocks.")
     
-    with tab4:
+    with tab4, profiler.phase("transactions tab"):
         st.markdown("<h2 class='section-header'>Transaction History</h2>", unsafe_allow_html=True)
         
-        if st.session_state.transactions:
-            # Convert to DataFrame for display
-            trans_df = pd.DataFrame(st.session_state.transactions)
-            
-            # Format for display
-            display_trans = trans_df.copy()
-            display_trans['price'] = display_trans['price'].apply(lambda x: f"${x:.2f}")
-            display_trans['total'] = display_trans['total'].apply(lambda x: f"${x:.2f}")
-            
-            # Add color coding for action
-            def color_action(action):
-                return 'color: green' if action == 'BUY' else 'color: red'
+        # Maintained at write time, so no scan of the ledger here
+        aggregates = st.session_state.aggregates
+        transaction_count = aggregates.buy_count + aggregates.sell_count
+        
+        if transaction_count:
+            # Only the visible page is read from the ledger
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key="txn_page_size")
+            page_count = max(1, -(-transaction_count // page_size))
+            with col2:
+                page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1, key="txn_page")
+            with col3:
+                st.caption(f"{transaction_count} transactions · page {page} of {page_count}")
             
-            # Display styled DataFrame
             st.dataframe(
-                display_trans.style.applymap(color_action, subset=['action']),
+                tracker.get_transactions_page(page, page_size),
                 width='stretch',
-                hide_index=True
+                hide_index=True,
+                column_config=TRANSACTION_COLUMN_CONFIG
             )
             
             # Transaction summary
             st.markdown("<h3 class='section-header'>Transaction Summary</h3>", unsafe_allow_html=True)
             
-            buy_count = sum(1 for t in st.session_state.transactions if t['action'] == 'BUY')
-            sell_count = sum(1 for t in st.session_state.transactions if t['action'] == 'SELL')
-            total_volume = sum(t['total'] for t in st.session_state.transactions)
-            
-            col1, col2, col3 = st.columns(3)
+            col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Total Transactions", len(st.session_state.transactions))
+                st.metric("Total Transactions", transaction_count)
             with col2:
-                st.metric("Buy/Sell Ratio", f"{buy_count}/{sell_count}")
+                st.metric("Buy/Sell Ratio", f"{aggregates.buy_count}/{aggregates.sell_count}")
             with col3:
-                st.metric("Total Volume", f"${total_volume:,.2f}")
+                st.metric("Total Volume", f"${aggregates.total_volume:,.2f}")
+            with col4:
+                st.metric("Realized P&L", f"${aggregates.total_realized:,.2f}")
+            
+            pnl_df = tracker.get_pnl_by_symbol(holdings_df)
+            if not pnl_df.empty:
+                st.dataframe(
+                    pnl_df,
+                    width='stretch',
+                    hide_index=True,
+                    column_config={
+                        'symbol': st.column_config.TextColumn("Symbol"),
+                        'realized': st.column_config.NumberColumn("Realized P&L", format="$%.2f"),
+                        'unrealized': st.column_config.NumberColumn("Unrealized P&L", format="$%.2f"),
+                        'total': st.column_config.NumberColumn("Total P&L", format="$%.2f")
+                    }
+                )
+            
+            if st.button("🔍 Verify Aggregates", help="Rebuild the summary from the full ledger and compare"):
+                mismatches = aggregates.verify(tracker.store.iter_records()) + st.session_state.lot_book.verify()
+                if mismatches:
+                    st.error("Aggregates drifted from the ledger:\n\n" + "\n".join(f"- {m}" for m in mismatches))
+                else:
+                    st.success("✅ Aggregates match a full rebuild of the ledger")
         else:
             st.info("No transactions yet. Buy or sell stocks to see transaction history.")
     
+    with tab5, profiler.phase("risk tab"):
+        st.markdown("<h2 class='section-header'>Risk Analytics</h2>", unsafe_allow_html=True)
+        
+        if not holdings_df.empty:
+            col1, col2 = st.columns(2)
+            with col1:
+                risk_period = st.selectbox("Lookback", ["3mo", "6mo", "1y", "2y", "5y"], index=2, key="risk_period")
+            with col2:
+                confidence = st.selectbox("VaR Confidence", [0.95, 0.99], format_func=lambda c: f"{c:.0%}", key="risk_confidence")
+            
+            risk = tracker.get_risk_metrics(holdings_df, risk_period, confidence)
+            if tracker.pending_risk:
+                st.caption(
+                    f"⏳ Price history pending for {len(tracker.pending_risk)} symbols "
+                    "— excluded until it arrives."
+                )
+            if risk is None or risk['periods'] < 2:
+                st.info("Not enough price history to compute risk metrics.")
+            else:
+                if risk['missing']:
+                    st.caption("No price history for " + ", ".join(risk['missing']) + " — excluded from risk metrics.")
+                
+                value = risk['portfolio_value']
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Annualized Volatility", f"{risk['volatility'] * 100:.2f}%")
+                with col2:
+                    st.metric(
+                        f"Beta vs {risk['benchmark']}",
+                        f"{risk['portfolio_beta']:.2f}" if risk['portfolio_beta'] is not None else "n/a"
+                    )
+                with col3:
+                    st.metric(
+                        f"1-Day VaR {confidence:.0%} (historical)",
+                        f"${risk['var_historical'] * value:,.2f}",
+                        help=f"Expected shortfall: ${risk['cvar_historical'] * value:,.2f}"
+                    )
+                with col4:
+                    st.metric(f"1-Day VaR {confidence:.0%} (parametric)", f"${risk['var_parametric'] * value:,.2f}")
+                
+                # Rolling volatility
+                rolling = risk['rolling_volatility']
+                if not rolling.empty:
+                    fig = get_figure_cache().get_or_build(
+                        'rolling_volatility',
+                        data_fingerprint(rolling, CHART_MAX_POINTS),
+                        lambda: build_rolling_volatility_figure(rolling)
+                    )
+                    st.plotly_chart(fig, width='stretch')
+                
+                # Per-holding risk
+                risk_df = pd.DataFrame({
+                    'symbol': risk['symbols'],
+                    'volatility': risk['holding_volatility'].to_numpy() * 100,
+                    'beta': risk['beta'].to_numpy(),
+                    'risk_contribution': risk['risk_contribution'].to_numpy() * 100
+                }).sort_values('risk_contribution', ascending=False, ignore_index=True)
+                st.dataframe(
+                    risk_df,
+                    width='stretch',
+                    hide_index=True,
+                    column_config={
+                        'symbol': st.column_config.TextColumn("Symbol"),
+                        'volatility': st.column_config.NumberColumn("Volatility", format="%.2f%%"),
+                        'beta': st.column_config.NumberColumn("Beta", format="%.2f"),
+                        'risk_contribution': st.column_config.NumberColumn("Share of Risk", format="%.2f%%")
+                    }
+                )
+                
+                # Correlation heatmap
+                correlation = risk['correlation']
+                if len(correlation) > 1:
+                    fig = get_figure_cache().get_or_build(
+                        'correlation',
+                        data_fingerprint(correlation),
+                        lambda: build_correlation_figure(correlation)
+                    )
+                    st.plotly_chart(fig, width='stretch')
+        else:
+            st.info("No holdings in portfolio. Use the sidebar to add stocks.")
+    
     # Footer
     st.markdown("---")
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -678,5 +3474,40 @@ def main():
             unsafe_allow_html=True
         )
 
+    if profiler.enabled:
+        render_profile_panel(profiler)
+
+def render_profile_panel(profiler: RenderProfiler):
+    """Show the rerun timing breakdown and offer the JSON trace"""
+    trace = profiler.to_trace()
+    trace_json = json.dumps(trace)
+
+    # Optional trace dump for tracking regressions across releases
+    trace_dir = os.environ.get('PORTFOLIO_PROFILE_DIR')
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+        with open(os.path.join(trace_dir, f"render_trace_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"), 'w') as f:
+            f.write(trace_json)
+
+    with st.expander(f"⏱️ Render Profile — {trace['metadata']['total_ms']:.0f} ms", expanded=True):
+        summary = profiler.summary()
+        phases = summary[summary['kind'] == 'phase']
+        if not phases.empty:
+            fig = go.Figure(go.Bar(
+                x=phases['total_ms'],
+                y=phases['name'],
+                orientation='h',
+                marker_color='#1E3A8A'
+            ))
+            fig.update_layout(title="Rerun phases (ms)", height=300, yaxis=dict(autorange='reversed'))
+            st.plotly_chart(fig, width='stretch')
+        st.dataframe(summary, hide_index=True, width='stretch')
+        st.download_button(
+            label="Download JSON trace",
+            data=trace_json,
+            file_name=f"render_trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json"
+        )
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
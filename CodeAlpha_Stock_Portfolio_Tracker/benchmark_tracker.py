@@ -0,0 +1,234 @@
+"""Benchmarks for PortfolioTracker core operations
+
+Runs each operation at several portfolio sizes (holdings and transactions)
+against the offline LocalQuoteProvider and a plain stand-in for
+st.session_state, and reports time per call, throughput and peak traced
+memory. Results can be saved as JSON and compared with a saved baseline:
+
+    python benchmark_tracker.py --sizes 10,1000,100000 --json results.json
+    python benchmark_tracker.py --compare results.json --tolerance 0.25
+"""
+
+import argparse
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+import Stock_Portfolio_Tracker as spt
+
+class SessionStateStub(dict):
+    """Attribute-style dict standing in for st.session_state outside a Streamlit run"""
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+    def __delattr__(self, key):
+        del self[key]
+
+def build_trades(size: int) -> str:
+    """CSV of `size` BUY trades over `size` distinct symbols"""
+    rng = np.random.default_rng(size)
+    trades = pd.DataFrame({
+        'symbol': [f"S{i:06d}" for i in range(size)],
+        'quantity': rng.integers(10, 500, size),
+        'price': rng.uniform(5, 500, size).round(2),
+        'action': 'BUY',
+        'date': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1500, size), unit='D')
+    })
+    return trades.to_csv(index=False)
+
+def make_tracker(data_dir: str, size: int) -> spt.PortfolioTracker:
+    """Tracker over a fresh ledger seeded with `size` holdings and transactions"""
+    spt.st.session_state = SessionStateStub()
+    tracker = spt.PortfolioTracker(
+        provider=spt.LocalQuoteProvider(),
+        quote_cache=spt.QuoteCache(max_size=2 * size + 1000),
+        history_store=spt.HistoryStore(os.path.join(data_dir, 'history')),
+        store=spt.PortfolioStore(os.path.join(data_dir, 'portfolio.db')),
+        fetcher=spt.PriceFetcher()
+    )
+    # No render deadline while benchmarking; a slow call should be measured, not cut short
+    tracker.render_deadline = time.monotonic() + 24 * 3600
+    tracker.import_trades(io.StringIO(build_trades(size)), 'seed.csv')
+    return tracker
+
+def drain(result):
+    """Consume an export buffer so the write is not left half done"""
+    buffer = result[0]
+    buffer.seek(0, os.SEEK_END)
+    size = buffer.tell()
+    buffer.close()
+    return size
+
+def operations(tracker: spt.PortfolioTracker, data_dir: str, size: int, batch: int,
+               history_max_size: int) -> Dict[str, Dict]:
+    """Benchmarked operations: callable plus the number of items one call handles"""
+    symbols = list(spt.st.session_state.portfolio)[:batch]
+
+    def add_stock():
+        for symbol in symbols:
+            tracker.add_stock(symbol, 1, 100.0)
+
+    def remove_stock():
+        for symbol in symbols:
+            tracker.remove_stock(symbol, 1)
+
+    def track_portfolio_history():
+        # Drop the persisted curve so every call values the seeded ledger
+        # against the history store (get_close_matrix, compute_valuation_history)
+        for path in glob.glob(os.path.join(data_dir, 'valuation_history_*')):
+            os.remove(path)
+        spt.st.session_state.pop('portfolio_history_key', None)
+        tracker.track_portfolio_history()
+
+    def track_portfolio_history_incremental():
+        # One new trade on top of the persisted curve: only its symbol's closes are read
+        tracker.add_stock(symbols[0], 1, 100.0)
+        tracker.track_portfolio_history()
+
+    def export(format_type: str, dataset: str) -> Callable:
+        return lambda: drain(tracker.export_portfolio(format_type, dataset))
+
+    ops = {
+        'add_stock': {'run': add_stock, 'items': len(symbols)},
+        'remove_stock': {'run': remove_stock, 'items': len(symbols)},
+        'calculate_portfolio_value': {'run': tracker.calculate_portfolio_value, 'items': size},
+        'track_portfolio_history': {'run': track_portfolio_history, 'items': size},
+        'track_portfolio_history[after add_stock]': {'run': track_portfolio_history_incremental, 'items': 1},
+        'export_portfolio[csv,holdings]': {'run': export('csv', 'holdings'), 'items': size},
+        'export_portfolio[jsonl,transactions]': {'run': export('jsonl', 'transactions'), 'items': size},
+        'export_portfolio[parquet,transactions]': {'run': export('parquet', 'transactions'), 'items': size},
+        'export_portfolio[json]': {'run': export('json', 'holdings'), 'items': size}
+    }
+    # The value curve reads every symbol's price history from disk; past
+    # this size one call takes minutes
+    if size > history_max_size:
+        del ops['track_portfolio_history'], ops['track_portfolio_history[after add_stock]']
+    return ops
+
+def measure(run: Callable, repeats: int) -> Dict[str, float]:
+    """Wall time over `repeats` calls, then peak traced memory of one more call"""
+    run()  # warm caches and imports
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'peak_mb': peak / 2 ** 20
+    }
+
+def run_benchmarks(sizes: List[int], repeats: int, batch: int, only: List[str] = None,
+                   history_max_size: int = 1000) -> List[Dict]:
+    """Benchmark every operation at every size"""
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix='portfolio-bench-') as data_dir:
+            os.environ['PORTFOLIO_DATA_DIR'] = data_dir
+            start = time.perf_counter()
+            tracker = make_tracker(data_dir, size)
+            print(f"\n== {size:,} holdings / transactions (setup {time.perf_counter() - start:.2f}s)")
+
+            for name, op in operations(tracker, data_dir, size, min(batch, size), history_max_size).items():
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                stats = measure(op['run'], repeats)
+                stats.update({
+                    'operation': name,
+                    'size': size,
+                    'items_per_s': op['items'] / stats['median_s'] if stats['median_s'] else float('inf')
+                })
+                results.append(stats)
+                print(f"{name:<42} {stats['median_s'] * 1000:>10.2f} ms  "
+                      f"{stats['items_per_s']:>14,.0f} items/s  {stats['peak_mb']:>9.1f} MB peak")
+            tracker.store._conn.close()
+    return results
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float, min_delta_ms: float) -> List[str]:
+    """Operations whose median time grew more than `tolerance` (and min_delta_ms) over the baseline"""
+    with open(baseline_path) as f:
+        baseline = {(r['operation'], r['size']): r for r in json.load(f)['results']}
+
+    regressions = []
+    print(f"\n== Compared with {baseline_path} (tolerance {tolerance:.0%})")
+    for result in results:
+        previous = baseline.get((result['operation'], result['size']))
+        if previous is None:
+            continue
+        change = result['median_s'] / previous['median_s'] - 1
+        delta_ms = (result['median_s'] - previous['median_s']) * 1000
+        flag = 'REGRESSION' if change > tolerance and delta_ms > min_delta_ms else ''
+        print(f"{result['operation']:<42} {result['size']:>8,}  {change:>+8.1%}  {flag}")
+        if flag:
+            regressions.append(f"{result['operation']} @ {result['size']:,}: {change:+.1%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PortfolioTracker core operations")
+    parser.add_argument('--sizes', default='10,1000,100000', help="comma-separated portfolio sizes")
+    parser.add_argument('--repeats', type=int, default=5, help="timed calls per operation")
+    parser.add_argument('--batch', type=int, default=100, help="add_stock / remove_stock calls per timed run")
+    parser.add_argument('--only', help="comma-separated substrings of operation names to run")
+    parser.add_argument('--history-max-size', type=int, default=1000,
+                        help="largest size at which track_portfolio_history is run")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', help="baseline results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="ignore slowdowns smaller than this (timer noise)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    only = args.only.split(',') if args.only else None
+    results = run_benchmarks(sizes, args.repeats, args.batch, only, args.history_max_size)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'results': results
+            }, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(f"- {r}" for r in regressions))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,16 @@ import requests
 from pathlib import Path
 from datetime import datetime
 import sys
-from time import sleep
+from time import sleep, monotonic
 import random
+import json
+from collections import defaultdict
+import errno
+import hashlib
+import fnmatch
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # Try to import rich for better formatting
 try:
@@ -36,7 +44,9 @@ class Colors:
     GREEN = '\033[92m'
     YELLOW = '\033[93m'
     RED = '\033[91m'
+    MAGENTA = '\033[95m'
     BOLD = '\033[1m'
+    DIM = '\033[2m'
     UNDERLINE = '\033[4m'
     END = '\033[0m'
 
@@ -138,67 +148,653 @@ def animated_progress(description="Processing..."):
             sleep(0.1)
         print()
 
-def safe_file_move(source_path, destination_path, file):
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+ZERO_COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+                         getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL)}
+
+class MoveVerificationError(OSError):
+    """The copied file does not match its source"""
+
+def _is_cloud_error(error):
+    """Windows Cloud Files provider errors (OneDrive placeholders, error 362)"""
+    return "cloud" in str(error).lower() or "362" in str(error)
+
+def _copy_kernel(src_fd, dst_fd, size):
     """
-    Safely move a file with error handling for Windows Cloud Files
+    Copy size bytes with copy_file_range, else sendfile, entirely in the
+    kernel. Returns False, having copied nothing, if neither applies here
     """
-    max_retries = 3
-    retry_delay = 1
+    copied = 0
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    if copy_file_range:
+        try:
+            while copied < size:
+                sent = copy_file_range(src_fd, dst_fd, min(COPY_CHUNK_SIZE, size - copied))
+                if not sent:
+                    break
+                copied += sent
+            return True
+        except OSError as e:
+            if copied or e.errno not in ZERO_COPY_UNSUPPORTED:
+                raise
     
-    for attempt in range(max_retries):
+    sendfile = getattr(os, 'sendfile', None)
+    if sendfile and sys.platform.startswith('linux'):
         try:
-            # Check if file exists
-            if not os.path.exists(source_path):
-                return False, f"Source file not found: {file}"
+            while copied < size:
+                sent = sendfile(dst_fd, src_fd, copied, min(COPY_CHUNK_SIZE, size - copied))
+                if not sent:
+                    break
+                copied += sent
+            return True
+        except OSError as e:
+            if copied or e.errno not in ZERO_COPY_UNSUPPORTED:
+                raise
+    return False
+
+def _copy_buffered(src_fd, dst_fd, digest=None):
+    """Copy through one reusable buffer, optionally hashing the bytes read"""
+    buffer = bytearray(COPY_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(src_fd, 'rb', buffering=0, closefd=False) as src, open(dst_fd, 'wb', buffering=0, closefd=False) as dst:
+        while True:
+            read = src.readinto(buffer)
+            if not read:
+                break
+            if digest is not None:
+                digest.update(view[:read])
+            written = 0
+            while written < read:
+                written += dst.write(view[written:read])
+
+def _file_digest(path):
+    """blake2b of a file's contents"""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def copy_verified(source_path, destination_path, verify='size'):
+    """
+    Copy a file across devices and make sure it arrived intact.
+    
+    Data moves in the kernel (copy_file_range / sendfile) where possible,
+    else through a single reused buffer. The copy is fsynced (with its
+    directory entry, where supported) and checked before returning:
+    verify='size' compares lengths and makes sure the source did not
+    change meanwhile; verify='hash' also re-reads the copy and compares a
+    blake2b of its contents with that of the bytes read from the source.
+    On failure the destination is truncated and the error raised.
+    """
+    src_fd = os.open(source_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        before = os.fstat(src_fd)
+        dst_fd = os.open(destination_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0))
+        try:
+            digest = None
+            if verify == 'hash':
+                digest = hashlib.blake2b()
+                _copy_buffered(src_fd, dst_fd, digest)
+            elif not _copy_kernel(src_fd, dst_fd, before.st_size):
+                _copy_buffered(src_fd, dst_fd)
             
-            # Create destination directory if it doesn't exist
-            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+            shutil.copystat(source_path, destination_path)
+            os.fsync(dst_fd)
             
-            # Handle duplicates
-            counter = 1
+            after = os.fstat(src_fd)
+            copied_size = os.fstat(dst_fd).st_size
+            if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+                raise MoveVerificationError(f"source changed while copying ({source_path})")
+            if copied_size != before.st_size:
+                raise MoveVerificationError(f"size mismatch: copied {copied_size:,} of {before.st_size:,} bytes")
+            if digest is not None and _file_digest(destination_path) != digest.hexdigest():
+                raise MoveVerificationError("content hash mismatch after copy")
+        except BaseException:
+            os.ftruncate(dst_fd, 0)
+            raise
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    
+    # Persist the new directory entry before the source goes away
+    if os.name == 'posix':
+        try:
+            dir_fd = os.open(os.path.dirname(os.path.abspath(destination_path)), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+def _move_once(source_path, destination_path, file, verify='size'):
+    """
+    Single move attempt. Returns (status, result) where status is 'moved',
+    'retry' (transient error, worth another attempt) or 'failed'.
+    
+    On the same filesystem this is one atomic rename. Across devices (or
+    for cloud placeholder files that refuse to be renamed) the file is
+    copied with copy_verified and the source is only deleted afterwards.
+    """
+    try:
+        if not os.path.exists(source_path):
+            return 'failed', f"Source file not found: {file}"
+        
+        try:
+            os.replace(source_path, destination_path)
+        except PermissionError:
+            raise
+        except OSError as e:
+            if e.errno != errno.EXDEV and not _is_cloud_error(e):
+                raise
+            copy_verified(source_path, destination_path, verify)
+            os.remove(source_path)
+        return 'moved', destination_path
+        
+    except PermissionError:
+        return 'retry', f"Permission denied for file: {file}"
+    
+    except MoveVerificationError as e:
+        return 'retry', f"Verification failed for {file}: {str(e)}"
+        
+    except OSError as e:
+        if _is_cloud_error(e):
+            return 'retry', f"Cloud file error for {file}: {str(e)}"
+        return 'retry', f"Error moving {file}: {str(e)}"
+        
+    except Exception as e:
+        return 'retry', f"Unexpected error for {file}: {str(e)}"
+
+class DestinationIndex:
+    """
+    Collision-free destination names for one target folder.
+    
+    The folder is listed once with os.scandir; after that the next free
+    name_N suffix of every base name is tracked in memory, so placing N
+    same-named files costs O(N) instead of O(N²) existence checks. Each
+    name is claimed by creating an empty placeholder with O_EXCL, which the
+    move then replaces, so concurrent workers (or other programs writing
+    to the folder) can never be given the same file name.
+    """
+    
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._taken = set()
+        self._next_suffix = {}
+        os.makedirs(folder, exist_ok=True)
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                self._taken.add(os.path.normcase(entry.name))
+    
+    def _candidate(self, file):
+        """Next unused name for file, marked as taken (caller holds the lock)"""
+        if os.path.normcase(file) not in self._taken:
+            name = file
+        else:
             base_name, ext = os.path.splitext(file)
-            original_dest = destination_path
-            
-            while os.path.exists(destination_path):
-                new_name = f"{base_name}_{counter}{ext}"
-                destination_path = os.path.join(os.path.dirname(original_dest), new_name)
+            key = os.path.normcase(file)
+            counter = self._next_suffix.get(key, 1)
+            name = f"{base_name}_{counter}{ext}"
+            while os.path.normcase(name) in self._taken:
                 counter += 1
-            
-            # Try to move the file
-            shutil.move(source_path, destination_path)
-            return True, destination_path
-            
-        except PermissionError as e:
-            if attempt < max_retries - 1:
-                sleep(retry_delay)
+                name = f"{base_name}_{counter}{ext}"
+            self._next_suffix[key] = counter + 1
+        self._taken.add(os.path.normcase(name))
+        return name
+    
+    def claim(self, file):
+        """Reserve a free destination path for file by creating it exclusively"""
+        while True:
+            with self._lock:
+                name = self._candidate(file)
+            destination_path = os.path.join(self.folder, name)
+            try:
+                os.close(os.open(destination_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return destination_path
+            except FileExistsError:
+                # Created by someone else since the scan; the name stays taken
                 continue
-            return False, f"Permission denied for file: {file}"
+    
+    def release(self, destination_path):
+        """Drop the placeholder of a claim whose move failed"""
+        try:
+            if os.path.getsize(destination_path) == 0:
+                os.remove(destination_path)
+        except OSError:
+            pass
+
+def safe_file_move(source_path, destination_path, file, index=None, verify='size'):
+    """
+    Safely move a file with error handling for Windows Cloud Files.
+    Pass a DestinationIndex to reuse one folder scan across many moves
+    """
+    max_retries = 3
+    retry_delay = 1
+    result = f"Failed to move {file} after {max_retries} attempts"
+    
+    for attempt in range(max_retries):
+        try:
+            if not os.path.exists(source_path):
+                return False, f"Source file not found: {file}"
             
+            # Creates the destination directory if it doesn't exist
+            if index is None:
+                index = DestinationIndex(os.path.dirname(destination_path))
+            target = index.claim(file)
+        except Exception as e:
+            status, result = 'retry', f"Unexpected error for {file}: {str(e)}"
+        else:
+            status, result = _move_once(source_path, target, file, verify)
+            if status != 'moved':
+                index.release(target)
+        
+        if status != 'retry':
+            return status == 'moved', result
+        if attempt < max_retries - 1:
+            sleep(retry_delay)
+    
+    return False, result
+
+# ==================== DUPLICATE DETECTION ====================
+HASH_INDEX_NAME = '.image_hashes.json'
+PARTIAL_HASH_BYTES = 64 * 1024
+
+class HashIndex:
+    """
+    Persistent cache of content hashes, keyed by path and valid while the
+    file's size and modification time are unchanged, so repeat runs do not
+    re-read files they have already hashed. Saved as JSON.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        self.stats = {'cached': 0, 'hashed': 0}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+    
+    def digest(self, path, kind):
+        """'partial' (first 64 KiB) or 'full' blake2b of a file"""
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or entry[:2] != [st.st_size, st.st_mtime_ns]:
+                entry = [st.st_size, st.st_mtime_ns, None, None]
+            value = entry[2 if kind == 'partial' else 3]
+            if value:
+                self.stats['cached'] += 1
+                return value
+        
+        hasher = hashlib.blake2b()
+        with open(path, 'rb') as f:
+            if kind == 'partial':
+                hasher.update(f.read(PARTIAL_HASH_BYTES))
+            else:
+                for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+        value = hasher.hexdigest()
+        
+        with self._lock:
+            self.stats['hashed'] += 1
+            if kind == 'partial':
+                entry[2] = value
+            else:
+                entry[3] = value
+            if st.st_size <= PARTIAL_HASH_BYTES:
+                # The first 64 KiB are the whole file
+                entry[2] = entry[3] = value
+            self._entries[key] = entry
+            self._dirty = True
+        return value
+    
+    def transfer(self, old_path, new_path):
+        """Keep the hashes of a file that was moved (rename and copy keep size and mtime)"""
+        with self._lock:
+            entry = self._entries.pop(os.path.abspath(old_path), None)
+            if entry:
+                self._entries[os.path.abspath(new_path)] = entry
+                self._dirty = True
+    
+    def forget(self, path):
+        """Drop the hashes of a file that was deleted"""
+        with self._lock:
+            if self._entries.pop(os.path.abspath(path), None):
+                self._dirty = True
+    
+    def save(self):
+        """Write the index atomically if anything changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+
+class DuplicateFinder:
+    """
+    Finds files whose content already exists in the destination folder.
+    
+    Candidates are grouped by size first; only files sharing a size are
+    hashed, and only those whose partial hashes also match get a full
+    hash. Files moved in during the run are added, so duplicates within
+    the source are caught too. Work on one size is serialized through
+    lock_for(size) while different sizes proceed in parallel.
+    """
+    
+    def __init__(self, folder, hash_index):
+        self.hash_index = hash_index
+        self._by_size = defaultdict(list)
+        self._locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.startswith(HASH_INDEX_NAME) or not entry.is_file():
+                    continue
+                size = entry.stat().st_size
+                if size:  # empty files include claim placeholders
+                    self._by_size[size].append(entry.path)
+    
+    def lock_for(self, size):
+        with self._lock:
+            return self._locks[size]
+    
+    def find(self, source_path, size):
+        """Path of a destination file identical to source_path, or None (hold lock_for(size))"""
+        candidates = [path for path in self._by_size.get(size, ()) if os.path.exists(path)]
+        if not candidates:
+            return None
+        
+        partial = self.hash_index.digest(source_path, 'partial')
+        matches = [path for path in candidates if self.hash_index.digest(path, 'partial') == partial]
+        if not matches:
+            return None
+        
+        full = self.hash_index.digest(source_path, 'full')
+        for path in matches:
+            if self.hash_index.digest(path, 'full') == full:
+                return path
+        return None
+    
+    def add(self, path, size):
+        """Register a file now present in the destination (hold lock_for(size))"""
+        if size:
+            self._by_size[size].append(path)
+
+# ==================== PARALLEL MOVE ENGINE ====================
+DEFAULT_MOVE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+class ImageMover:
+    """
+    Moves files on a bounded thread pool.
+    
+    Workers never sleep: a file that hits a transient error is handed back
+    and rescheduled after an exponential backoff while the pool keeps
+    moving other files. Final outcomes are reported from the worker threads
+    through on_progress(file, status, result), status being 'moved',
+    'duplicate' or 'failed'. verify selects how cross-device copies are
+    checked ('size' or 'hash', see copy_verified).
+    
+    With dedup='skip', files whose content already exists in the
+    destination are left where they are; with dedup='link' they are
+    removed from the source and their destination name is hardlinked to
+    the existing copy. Hashes persist in hash_index_path between runs.
+    """
+    
+    def __init__(self, destination_folder, workers=DEFAULT_MOVE_WORKERS, max_retries=3,
+                 retry_delay=1.0, on_progress=None, verify='size', dedup=None, hash_index_path=None):
+        self.destination_folder = destination_folder
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_progress = on_progress
+        self.verify = verify
+        self.dedup = dedup
+        self.hash_index_path = hash_index_path or os.path.join(destination_folder, HASH_INDEX_NAME)
+        self.index = None
+        self.duplicates = None
+        self.duplicate_files = []
+        
+    def _move(self, source_path, file, destination_path):
+        """Claim a destination name (first attempt only) and move the file there"""
+        if destination_path is None:
+            if not os.path.exists(source_path):
+                return 'failed', f"Source file not found: {file}", None
+            try:
+                destination_path = self.index.claim(file)
+            except OSError as e:
+                # e.g. the _N suffix made the name too long, or the folder is full or read-only
+                return 'retry', f"Could not reserve a destination name for {file}: {str(e)}", None
+        status, result = _move_once(source_path, destination_path, file, self.verify)
+        return status, result, destination_path
+    
+    def _link_duplicate(self, source_path, file, existing, destination_path):
+        """Point a new destination name at the existing copy, then drop the source"""
+        if destination_path is None:
+            destination_path = self.index.claim(file)
+        link_path = f"{destination_path}.{threading.get_ident()}.link"
+        try:
+            os.link(existing, link_path)
+            os.replace(link_path, destination_path)
+        finally:
+            if os.path.exists(link_path):
+                os.remove(link_path)
+        os.remove(source_path)
+        self.duplicates.hash_index.forget(source_path)
+        return destination_path
+    
+    def _move_unique(self, source_path, file, destination_path):
+        """Move the file unless its content is already in the destination"""
+        try:
+            size = os.stat(source_path).st_size
+        except FileNotFoundError:
+            return 'failed', f"Source file not found: {file}", destination_path
         except OSError as e:
-            if "cloud" in str(e).lower() or "362" in str(e):
-                # Cloud file provider error - try copy+delete method
+            return 'retry', f"Error reading {file}: {str(e)}", destination_path
+        
+        with self.duplicates.lock_for(size):
+            try:
+                existing = self.duplicates.find(source_path, size)
+                if existing and self.dedup == 'link':
+                    destination_path = self._link_duplicate(source_path, file, existing, destination_path)
+            except OSError as e:
+                return 'retry', f"Duplicate check failed for {file}: {str(e)}", destination_path
+            if existing:
+                return 'duplicate', existing, destination_path
+            
+            status, result, destination_path = self._move(source_path, file, destination_path)
+            if status == 'moved':
+                self.duplicates.add(destination_path, size)
+                self.duplicates.hash_index.transfer(source_path, destination_path)
+            return status, result, destination_path
+        
+    def _attempt(self, source_path, file, destination_path, attempt):
+        """Worker: one move attempt; reports the file once its outcome is final"""
+        if self.duplicates is not None:
+            status, result, destination_path = self._move_unique(source_path, file, destination_path)
+        else:
+            status, result, destination_path = self._move(source_path, file, destination_path)
+        
+        if status == 'retry' and attempt + 1 < self.max_retries:
+            return status, result, destination_path
+        if status == 'retry':
+            status = 'failed'
+        
+        linked = status == 'duplicate' and self.dedup == 'link'
+        if status != 'moved' and not linked and destination_path is not None:
+            self.index.release(destination_path)
+        if self.on_progress:
+            self.on_progress(file, status, result)
+        return status, result, destination_path
+        
+    def run(self, files):
+        """
+        Move every (source_path, file) pair from an iterable.
+        Returns (successful_files, failed_files); duplicates found in dedup
+        mode are collected in self.duplicate_files as (file, existing_path)
+        """
+        successful_files = []
+        failed_files = []
+        window = self.workers * 4  # bound on queued work, so the input is consumed lazily
+        files = iter(files)
+        self.index = DestinationIndex(self.destination_folder)  # one folder scan per run
+        self.duplicate_files = []
+        self.duplicates = DuplicateFinder(self.destination_folder, HashIndex(self.hash_index_path)) if self.dedup else None
+        
+        try:
+            self._dispatch(files, window, successful_files, failed_files)
+        finally:
+            if self.duplicates is not None:
+                self.duplicates.hash_index.save()
+        
+        return successful_files, failed_files
+    
+    def _dispatch(self, files, window, successful_files, failed_files):
+        """Feed the pool from files and the retry heap until both are drained"""
+        pending = {}
+        retries = []
+        sequence = 0
+        exhausted = False
+        
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mover') as pool:
+            while True:
+                now = monotonic()
+                while retries and retries[0][0] <= now and len(pending) < window:
+                    _, _, job = heapq.heappop(retries)
+                    pending[pool.submit(self._attempt, *job)] = job
+                while not exhausted and len(pending) < window:
+                    try:
+                        source_path, file = next(files)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    job = (source_path, file, None, 0)
+                    pending[pool.submit(self._attempt, *job)] = job
+                
+                if not pending:
+                    if exhausted and not retries:
+                        break
+                    sleep(max(retries[0][0] - now, 0))
+                    continue
+                
+                timeout = max(retries[0][0] - now, 0) if retries else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source_path, file, destination_path, attempt = pending.pop(future)
+                    try:
+                        status, result, destination_path = future.result()
+                    except Exception as e:
+                        # A bug or unexpected error in one worker fails that file, not the run
+                        status, result = 'failed', f"Unexpected error for {file}: {str(e)}"
+                        if destination_path is not None:
+                            self.index.release(destination_path)
+                        if self.on_progress:
+                            self.on_progress(file, status, result)
+                    if status == 'retry':
+                        sequence += 1
+                        ready_at = monotonic() + self.retry_delay * 2 ** attempt
+                        heapq.heappush(retries, (ready_at, sequence, (source_path, file, destination_path, attempt + 1)))
+                    elif status == 'moved':
+                        successful_files.append(file)
+                    elif status == 'duplicate':
+                        self.duplicate_files.append((file, result))
+                    else:
+                        failed_files.append((file, result))
+
+# ==================== IMAGE DISCOVERY ====================
+DEFAULT_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+HEIF_BRANDS = (b'heic', b'heix', b'hevc', b'hevx', b'heim', b'heis', b'mif1', b'msf1', b'avif')
+
+def sniff_image_type(path):
+    """Image format from the file's leading bytes, or None if it is not a known image"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+    except OSError:
+        return None
+    
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    if head[4:8] == b'ftyp' and head[8:12] in HEIF_BRANDS:
+        return 'heic'
+    if head[:2] == b'BM':
+        return 'bmp'
+    return None
+
+def parse_extensions(text):
+    """'jpg, .PNG webp' -> ('.jpg', '.png', '.webp'); '*' means any extension (None)"""
+    names = [name.strip().lower().lstrip('.') for name in re.split(r'[,\s]+', text) if name.strip()]
+    if '*' in names:
+        return None
+    return tuple(f".{name}" for name in names) or DEFAULT_IMAGE_EXTENSIONS
+
+def _matches_any(patterns, rel_path, name):
+    """True if a glob matches the path relative to the source folder or the bare name"""
+    return any(fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def discover_images(source_folder, extensions=DEFAULT_IMAGE_EXTENSIONS, recursive=False,
+                    include=(), exclude=(), sniff=False, skip_folders=()):
+    """
+    Lazily yield an os.DirEntry for every matching file under source_folder.
+    
+    Built on os.scandir, so file type checks reuse the directory listing
+    instead of a stat per entry. Globs are matched against the path
+    relative to source_folder (with '/' separators) and against the name;
+    excluded or skipped folders (e.g. a destination inside the source) are
+    not descended into. With sniff=True a file is only kept if its leading
+    bytes are a known image format.
+    """
+    skip_folders = {os.path.normcase(os.path.abspath(folder)) for folder in skip_folders}
+    folders = [(source_folder, '')]
+    
+    while folders:
+        folder, prefix = folders.pop()
+        try:
+            entries = os.scandir(folder)
+        except OSError:
+            continue
+        
+        with entries:
+            for entry in entries:
+                rel_path = prefix + entry.name
                 try:
-                    shutil.copy2(source_path, destination_path)
-                    os.remove(source_path)
-                    return True, destination_path
-                except Exception as copy_error:
-                    if attempt < max_retries - 1:
-                        sleep(retry_delay)
+                    if entry.is_dir(follow_symlinks=False):
+                        if (recursive and not _matches_any(exclude, rel_path, entry.name)
+                                and os.path.normcase(os.path.abspath(entry.path)) not in skip_folders):
+                            folders.append((entry.path, rel_path + '/'))
                         continue
-                    return False, f"Cloud file error for {file}: {str(copy_error)}"
-            else:
-                if attempt < max_retries - 1:
-                    sleep(retry_delay)
+                    if not entry.is_file():
+                        continue
+                except OSError:
                     continue
-                return False, f"Error moving {file}: {str(e)}"
                 
-        except Exception as e:
-            if attempt < max_retries - 1:
-                sleep(retry_delay)
-                continue
-            return False, f"Unexpected error for {file}: {str(e)}"
-    
-    return False, f"Failed to move {file} after {max_retries} attempts"
+                if extensions and not entry.name.lower().endswith(extensions):
+                    continue
+                if include and not _matches_any(include, rel_path, entry.name):
+                    continue
+                if exclude and _matches_any(exclude, rel_path, entry.name):
+                    continue
+                if sniff and sniff_image_type(entry.path) is None:
+                    continue
+                yield entry
 
 # ==================== TASK 1: Move Image Files ====================
 def task1_move_image_files():
@@ -208,7 +804,7 @@ def task1_move_image_files():
     if RICH_AVAILABLE:
         console.print(Panel.fit(
             "[bold green]📸 TASK 1: MOVE IMAGE FILES[/]\n"
-            "[dim]Move JPG, JPEG, and PNG files between folders[/]",
+            "[dim]Move JPG, PNG, WEBP, HEIC and other image files between folders[/]",
             border_style="green"
         ))
         console.print()
@@ -244,13 +840,53 @@ def task1_move_image_files():
     # Expand user directory shortcuts
     destination_folder = os.path.expanduser(destination_folder)
     
+    # What to pick up
+    default_types = ",".join(ext.lstrip('.') for ext in DEFAULT_IMAGE_EXTENSIONS)
+    if RICH_AVAILABLE:
+        types = Prompt.ask("[cyan]🖼️  File types (e.g. jpg,png,webp,heic,gif,tiff or *)[/]", default=default_types)
+        recursive = Confirm.ask("[cyan]📂 Include subfolders?[/]", default=False)
+        include = Prompt.ask("[cyan]🔎 Only paths matching (globs, Enter for all)[/]", default="")
+        exclude = Prompt.ask("[cyan]🚫 Skip paths matching (globs, Enter for none)[/]", default="")
+        sniff = Confirm.ask("[cyan]🧪 Check file contents (magic bytes)?[/]", default=False)
+        verify = 'hash' if Confirm.ask("[cyan]🔐 Verify copies to another drive by hash (slower)?[/]", default=False) else 'size'
+        dedup = Prompt.ask("[cyan]♻️  Files already in the destination (same content)[/]", choices=["keep", "skip", "link"], default="keep")
+    else:
+        types = input(f"{Colors.CYAN}🖼️  File types (Enter for {default_types}, * for any):{Colors.END} ").strip() or default_types
+        recursive = input(f"{Colors.CYAN}📂 Include subfolders? (y/n):{Colors.END} ").lower() == 'y'
+        include = input(f"{Colors.CYAN}🔎 Only paths matching (globs, Enter for all):{Colors.END} ").strip()
+        exclude = input(f"{Colors.CYAN}🚫 Skip paths matching (globs, Enter for none):{Colors.END} ").strip()
+        sniff = input(f"{Colors.CYAN}🧪 Check file contents (magic bytes)? (y/n):{Colors.END} ").lower() == 'y'
+        verify = 'hash' if input(f"{Colors.CYAN}🔐 Verify copies to another drive by hash (slower)? (y/n):{Colors.END} ").lower() == 'y' else 'size'
+        dedup = input(f"{Colors.CYAN}♻️  Files already in the destination (same content): keep/skip/link (Enter for keep):{Colors.END} ").strip().lower()
+    
+    # keep: move anyway under a new name; skip: leave the source; link: hardlink and remove the source
+    dedup = dedup if dedup in ('skip', 'link') else None
+    
+    extensions = parse_extensions(types)
+    include = include.split()
+    exclude = exclude.split()
+    type_label = ", ".join(ext.lstrip('.').upper() for ext in extensions) if extensions else "Any"
+    if sniff:
+        type_label += " (content checked)"
+    
+    # Number of files moved in parallel
+    if RICH_AVAILABLE:
+        workers = Prompt.ask("[cyan]⚙️  Parallel workers[/]", default=str(DEFAULT_MOVE_WORKERS))
+    else:
+        workers = input(f"{Colors.CYAN}⚙️  Parallel workers (Enter for {DEFAULT_MOVE_WORKERS}):{Colors.END} ").strip()
+    workers = int(workers) if workers.isdigit() and int(workers) > 0 else DEFAULT_MOVE_WORKERS
+    
     # Show summary
     if RICH_AVAILABLE:
         console.print(Panel.fit(
             f"[bold]📋 Operation Summary[/]\n\n"
             f"[cyan]Source:[/] {source_folder}\n"
             f"[cyan]Destination:[/] {destination_folder}\n"
-            f"[cyan]File Types:[/] JPG, JPEG, PNG",
+            f"[cyan]File Types:[/] {type_label}\n"
+            f"[cyan]Subfolders:[/] {'Yes' if recursive else 'No'}\n"
+            f"[cyan]Copy check:[/] {verify}\n"
+            f"[cyan]Duplicates:[/] {dedup or 'keep'}\n"
+            f"[cyan]Workers:[/] {workers}",
             border_style="yellow"
         ))
     else:
@@ -258,7 +894,11 @@ def task1_move_image_files():
         print(f"{Colors.YELLOW}{'-'*60}{Colors.END}")
         print(f"{Colors.CYAN}Source:{Colors.END} {source_folder}")
         print(f"{Colors.CYAN}Destination:{Colors.END} {destination_folder}")
-        print(f"{Colors.CYAN}File Types:{Colors.END} JPG, JPEG, PNG")
+        print(f"{Colors.CYAN}File Types:{Colors.END} {type_label}")
+        print(f"{Colors.CYAN}Subfolders:{Colors.END} {'Yes' if recursive else 'No'}")
+        print(f"{Colors.CYAN}Copy check:{Colors.END} {verify}")
+        print(f"{Colors.CYAN}Duplicates:{Colors.END} {dedup or 'keep'}")
+        print(f"{Colors.CYAN}Workers:{Colors.END} {workers}")
         print(f"{Colors.YELLOW}{'-'*60}{Colors.END}")
     
     # Confirm action
@@ -274,92 +914,95 @@ def task1_move_image_files():
     
     # Execute the move operation
     try:
-        animated_progress("🔍 Scanning for image files...")
-        
         # Create destination folder
         Path(destination_folder).mkdir(parents=True, exist_ok=True)
         
-        # Find image files
-        image_extensions = ('.jpg', '.jpeg', '.png')
-        image_files = []
-        
-        for file in os.listdir(source_folder):
-            file_path = os.path.join(source_folder, file)
-            if os.path.isfile(file_path) and file.lower().endswith(image_extensions):
-                image_files.append(file)
-        
-        if not image_files:
-            print_colored("\n📭 No JPG or PNG files found in the source folder!", Colors.YELLOW)
-            input("\nPress Enter to continue...")
-            return
-        
-        # Count files by type
-        jpg_count = sum(1 for f in image_files if f.lower().endswith(('.jpg', '.jpeg')))
-        png_count = sum(1 for f in image_files if f.lower().endswith('.png'))
-        
-        # Show found files
-        if RICH_AVAILABLE:
-            console.print(f"\n[green]✅ Found {len(image_files)} image file(s):[/]")
-            console.print(f"   📷 [cyan]JPG/JPEG:[/] {jpg_count} file(s)")
-            console.print(f"   🖼️  [cyan]PNG:[/] {png_count} file(s)")
-        else:
-            print(f"\n{Colors.GREEN}✅ Found {len(image_files)} image file(s):{Colors.END}")
-            print(f"   📷 {Colors.CYAN}JPG/JPEG:{Colors.END} {jpg_count} file(s)")
-            print(f"   🖼️  {Colors.CYAN}PNG:{Colors.END} {png_count} file(s)")
+        # Files stream from the scan straight into the mover
+        entries = discover_images(
+            source_folder,
+            extensions=extensions,
+            recursive=recursive,
+            include=include,
+            exclude=exclude,
+            sniff=sniff,
+            skip_folders=(destination_folder,)
+        )
+        type_counts = {}
         
-        # Move files with error handling
-        moved_count = 0
-        failed_files = []
-        successful_files = []
+        def found(on_found=None):
+            for entry in entries:
+                ext = os.path.splitext(entry.name)[1].lower().lstrip('.') or 'other'
+                type_counts[ext] = type_counts.get(ext, 0) + 1
+                if on_found:
+                    on_found()
+                yield entry.path, entry.name
         
         if RICH_AVAILABLE:
             with Progress() as progress:
-                task = progress.add_task("[cyan]Moving files...", total=len(image_files))
-                for file in image_files:
-                    source_path = os.path.join(source_folder, file)
-                    destination_path = os.path.join(destination_folder, file)
-                    
-                    success, result = safe_file_move(source_path, destination_path, file)
-                    
-                    if success:
-                        moved_count += 1
-                        successful_files.append(file)
-                    else:
-                        failed_files.append((file, result))
-                    
-                    progress.update(task, advance=1)
-        else:
-            print(f"\n{Colors.CYAN}Moving files:{Colors.END}")
-            for i, file in enumerate(image_files, 1):
-                source_path = os.path.join(source_folder, file)
-                destination_path = os.path.join(destination_folder, file)
+                task = progress.add_task("[cyan]Scanning and moving files...", total=None)
+                discovered = [0]
                 
-                success, result = safe_file_move(source_path, destination_path, file)
+                def on_found():
+                    discovered[0] += 1
+                    progress.update(task, total=discovered[0])
                 
-                if success:
-                    moved_count += 1
-                    successful_files.append(file)
-                    emoji = "🖼️" if file.lower().endswith('.png') else "📷"
-                    print(f"   ✅ {emoji} Moved: {file}")
-                else:
-                    failed_files.append((file, result))
-                    print(f"   ❌ Failed: {file}")
+                mover = ImageMover(
+                    destination_folder,
+                    workers=workers,
+                    verify=verify,
+                    dedup=dedup,
+                    on_progress=lambda file, status, result: progress.update(task, advance=1)
+                )
+                successful_files, failed_files = mover.run(found(on_found))
+        else:
+            print(f"\n{Colors.CYAN}Scanning and moving files:{Colors.END}")
+            print_lock = threading.Lock()
+            
+            def report(file, status, result):
+                with print_lock:
+                    if status == 'moved':
+                        emoji = "🖼️" if file.lower().endswith('.png') else "📷"
+                        print(f"   ✅ {emoji} Moved: {file}")
+                    elif status == 'duplicate':
+                        print(f"   ♻️  Duplicate: {file} = {os.path.basename(result)}")
+                    else:
+                        print(f"   ❌ Failed: {file}")
+            
+            mover = ImageMover(destination_folder, workers=workers, on_progress=report, verify=verify, dedup=dedup)
+            successful_files, failed_files = mover.run(found())
+        
+        total_found = sum(type_counts.values())
+        if not total_found:
+            print_colored("\n📭 No matching image files found in the source folder!", Colors.YELLOW)
+            input("\nPress Enter to continue...")
+            return
+        
+        moved_count = len(successful_files)
         
         # Display results
         if RICH_AVAILABLE:
             if moved_count > 0:
                 success_panel = Panel.fit(
                     f"[bold green]🎉 PARTIAL SUCCESS![/]\n\n"
-                    f"Moved [cyan]{moved_count}[/] out of [cyan]{len(image_files)}[/] file(s) to:\n"
+                    f"Moved [cyan]{moved_count}[/] out of [cyan]{total_found}[/] file(s) to:\n"
                     f"[yellow]{destination_folder}[/]\n\n"
-                    f"[dim]File breakdown:[/]\n"
-                    f"📷 JPG/JPEG files: [cyan]{jpg_count}[/]\n"
-                    f"🖼️  PNG files: [cyan]{png_count}[/]",
+                    f"[dim]File breakdown:[/]\n" +
+                    "\n".join(f"🖼️  {ext.upper()} files: [cyan]{count}[/]" for ext, count in sorted(type_counts.items())),
                     border_style="green",
                     padding=(1, 2)
                 )
                 console.print(success_panel)
             
+            if mover.duplicate_files:
+                action = "hardlinked to" if dedup == 'link' else "left in place, already in"
+                console.print(Panel.fit(
+                    f"[bold cyan]♻️  {len(mover.duplicate_files)} DUPLICATE FILE(S)[/] {action} the destination\n\n" +
+                    "\n".join([f"[yellow]• {file}[/] = {os.path.basename(existing)}" for file, existing in mover.duplicate_files[:5]]) +
+                    (f"\n[dim]... and {len(mover.duplicate_files) - 5} more[/]" if len(mover.duplicate_files) > 5 else ""),
+                    border_style="cyan",
+                    padding=(1, 2)
+                ))
+            
             if failed_files:
                 error_panel = Panel.fit(
                     f"[bold red]⚠️  FAILED TO MOVE {len(failed_files)} FILE(S)[/]\n\n" +
@@ -385,13 +1028,17 @@ def task1_move_image_files():
             if moved_count > 0:
                 print(f"\n{Colors.GREEN}{'🎉 PARTIAL SUCCESS!':^60}{Colors.END}")
                 print(f"{Colors.GREEN}{'-'*60}{Colors.END}")
-                print(f"Moved {Colors.CYAN}{moved_count}{Colors.END} out of {Colors.CYAN}{len(image_files)}{Colors.END} file(s) to:")
+                print(f"Moved {Colors.CYAN}{moved_count}{Colors.END} out of {Colors.CYAN}{total_found}{Colors.END} file(s) to:")
                 print(f"{Colors.YELLOW}{destination_folder}{Colors.END}")
                 print(f"\n{Colors.DIM}File breakdown:{Colors.END}")
-                print(f"📷 JPG/JPEG files: {Colors.CYAN}{jpg_count}{Colors.END}")
-                print(f"🖼️  PNG files: {Colors.CYAN}{png_count}{Colors.END}")
+                for ext, count in sorted(type_counts.items()):
+                    print(f"🖼️  {ext.upper()} files: {Colors.CYAN}{count}{Colors.END}")
                 print(f"{Colors.GREEN}{'-'*60}{Colors.END}")
             
+            if mover.duplicate_files:
+                action = "hardlinked to" if dedup == 'link' else "left in place, already in"
+                print(f"\n{Colors.CYAN}♻️  {len(mover.duplicate_files)} duplicate file(s) {action} the destination{Colors.END}")
+            
             if failed_files:
                 print(f"\n{Colors.RED}{f'⚠️  FAILED TO MOVE {len(failed_files)} FILE(S)':^60}{Colors.END}")
                 for i, (file, error) in enumerate(failed_files[:5], 1):